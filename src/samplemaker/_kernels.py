@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Numeric kernels used internally by `samplemaker`.
+
+The functions in this module operate on plain numpy arrays only. If numba is
+installed they are compiled to native code, otherwise they run as regular
+Python functions. numba is an optional dependency.
+"""
+
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    HAS_NUMBA = True
+except ImportError:
+    HAS_NUMBA = False
+    def njit(*args, **kwargs):
+        # numba not available, return the function unchanged
+        if(len(args)==1 and callable(args[0])):
+            return args[0]
+        def decorator(fn):
+            return fn
+        return decorator
+
+@njit(cache=True)
+def _align_positions(llx, lly, urx, ury, bx, by, min_dx, min_dy):
+    # Computes the table positions used by DeviceTable.auto_align.
+    # All input arrays have shape (nrow,ncol), bx and by are the numkey points
+    # of each bounding box. Returns an array of shape (nrow,ncol,2).
+    nrow = llx.shape[0]
+    ncol = llx.shape[1]
+    pos_xy = np.zeros((nrow,ncol,2))
+    x_extrR = np.full(ncol,-1e23)
+    x_extrL = np.full(ncol,1e23)
+    y_extrT = np.full(nrow,-1e23)
+    y_extrB = np.full(nrow,1e23)
+    for i in range(ncol):
+        for j in range(nrow):
+            pos_xy[j,i,0] = -bx[j,i]
+            pos_xy[j,i,1] = -by[j,i]
+            if(urx[j,i]-bx[j,i]>x_extrR[i]): x_extrR[i] = urx[j,i]-bx[j,i]
+            if(ury[j,i]-by[j,i]>y_extrT[j]): y_extrT[j] = ury[j,i]-by[j,i]
+            if(llx[j,i]-bx[j,i]<x_extrL[i]): x_extrL[i] = llx[j,i]-bx[j,i]
+            if(lly[j,i]-by[j,i]<y_extrB[j]): y_extrB[j] = lly[j,i]-by[j,i]
+    # Cumulative shifts along columns and rows
+    sx = 0.0
+    for i in range(1,ncol):
+        sx += x_extrR[i-1]-x_extrL[i]+min_dx
+        for j in range(nrow):
+            pos_xy[j,i,0] += sx
+    sy = 0.0
+    for j in range(1,nrow):
+        sy += y_extrT[j-1]-y_extrB[j]+min_dy
+        for i in range(ncol):
+            pos_xy[j,i,1] += sy
+    return pos_xy
+
+@njit(cache=True, fastmath=True)
+def _tapered_path_core(x, y, w):
+    # Outline of a tapered path with more than two points (see makers.make_tapered_path).
+    # Returns the polygon x and y coordinates: the right side of the path followed
+    # by the left side in reverse order.
+    Npts = x.shape[0]
+    Nout = 3*Npts-2
+    xp = np.empty(Nout)
+    yp = np.empty(Nout)
+    k1 = 0
+    k2 = Nout-1
+    # cos(a-pi/2) = sin(a), sin(a-pi/2) = -cos(a), cos(a+pi/2) = -sin(a), sin(a+pi/2) = cos(a)
+    ang2 = math.atan2(y[1]-y[0],x[1]-x[0])
+    c2 = math.cos(ang2)
+    s2 = math.sin(ang2)
+    for j in range(1,Npts-1):
+        # the outgoing segment of vertex j-1 is the incoming one of vertex j
+        ang1 = ang2
+        c1 = c2
+        s1 = s2
+        ang2 = math.atan2(y[j+1]-y[j],x[j+1]-x[j])
+        c2 = math.cos(ang2)
+        s2 = math.sin(ang2)
+        d = (x[j+1]-x[j-1])*(y[j]-y[j-1]) - (y[j+1]-y[j-1])*(x[j]-x[j-1])
+        hw = w[j]*0.5
+        if(j==1):
+            xp[k1] = x[j-1]+w[j-1]*0.5*s1
+            yp[k1] = y[j-1]-w[j-1]*0.5*c1
+            k1 += 1
+            xp[k2] = x[j-1]-w[j-1]*0.5*s1
+            yp[k2] = y[j-1]+w[j-1]*0.5*c1
+            k2 -= 1
+        wx = hw/math.cos((ang2-ang1)*0.5)
+        # a0 = pi/2-(ang1+ang2)/2
+        ca0 = math.sin((ang1+ang2)*0.5)
+        sa0 = math.cos((ang1+ang2)*0.5)
+        if(d<0):
+            xp[k1] = x[j]+hw*s1
+            yp[k1] = y[j]-hw*c1
+            xp[k1+1] = x[j]+hw*s2
+            yp[k1+1] = y[j]-hw*c2
+            k1 += 2
+            xp[k2] = x[j]-wx*ca0
+            yp[k2] = y[j]+wx*sa0
+            k2 -= 1
+        else:
+            xp[k2] = x[j]-hw*s1
+            yp[k2] = y[j]+hw*c1
+            xp[k2-1] = x[j]-hw*s2
+            yp[k2-1] = y[j]+hw*c2
+            k2 -= 2
+            xp[k1] = x[j]+wx*ca0
+            yp[k1] = y[j]-wx*sa0
+            k1 += 1
+        if(j==Npts-2):
+            xp[k1] = x[j+1]+w[j+1]*0.5*s2
+            yp[k1] = y[j+1]-w[j+1]*0.5*c2
+            k1 += 1
+            xp[k2] = x[j+1]-w[j+1]*0.5*s2
+            yp[k2] = y[j+1]+w[j+1]*0.5*c2
+            k2 -= 1
+    return xp, yp
+
+@njit(cache=True)
+def _advance_state(x, y, a, xd, yd, xdo, ydo, ad):
+    # New sequencer position after inserting a device (see sequencer.__insertDevice).
+    # (xd,yd) is the input port, (xdo,ydo) the output port and ad the input
+    # port angle in degrees, a is the current sequencer angle in degrees.
+    da = math.radians(a-ad)
+    c = math.cos(da)
+    s = math.sin(da)
+    return x+((xdo-xd)*c-(ydo-yd)*s), y+((xdo-xd)*s+(ydo-yd)*c)
+
+@njit(cache=True)
+def _rotate_points(data, x0, y0, cost, sint, tx, ty):
+    # Rotates the interleaved x0,y0,x1,y1,... points in place around (x0,y0)
+    # and moves the rotation center to (tx,ty) (see shapes.Poly.rotate).
+    for i in range(0,data.shape[0]-1,2):
+        x = data[i]-x0
+        y = data[i+1]-y0
+        data[i] = cost*x-sint*y+tx
+        data[i+1] = sint*x+cost*y+ty
+
+@njit(cache=True)
+def _point_in_poly(data, x, y):
+    # Crossing number test of (x,y) against a closed polygon stored as
+    # interleaved points (see shapes.Poly.point_inside).
+    c = False
+    bpx = data[0]
+    bpy = data[1]
+    for i in range(2,data.shape[0]-1,2):
+        fpx = data[i]
+        fpy = data[i+1]
+        if((fpy > y) != (bpy > y)):
+            if(x < ((bpx - fpx)*(y-fpy)/(bpy-fpy)+fpx)):
+                c = not c
+        bpx = fpx
+        bpy = fpy
+    return c
@@ -283,6 +283,12 @@ class DevicePort:
         dx = other.x0-self.x0
         dy = other.y0-self.y0
         return math.sqrt(dx*dx+dy*dy)
+    
+    def clone(self):
+        # Cheap copy of position and orientation, geometry and parent ports are shared
+        p = type(self).__new__(type(self))
+        p.__dict__.update(self.__dict__)
+        return p
 
 
     
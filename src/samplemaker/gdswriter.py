@@ -11,6 +11,7 @@ import math
 import numpy as np
 import struct
 import time
+import os
 import samplemaker.shapes as smsh
 from samplemaker.shapes import GeomGroup
 
@@ -83,7 +84,7 @@ class GDSWriter:
         self.fid.write(struct.pack(">%sH" % buf.size,*buf))
         self.fid.write(struct.pack(">i",math.floor(path.width*1000)))
         self.fid.write(struct.pack(">2H",8*len(path.xpts)+4,0x1003))
-        data = np.transpose(np.round_((np.array([path.xpts,path.ypts])*1000)).astype(int)).reshape(-1)
+        data = np.transpose(np.rint((np.array([path.xpts,path.ypts])*1000)).astype(int)).reshape(-1)
         self.fid.write(struct.pack(">%si" % data.size,*data))
         self.fid.write(struct.pack(">2H",4,0x1100))
         
@@ -167,7 +168,7 @@ class GDSWriter:
         gg.group=group
         return gg
         
-    def open_library(self,filename: str):
+    def open_library(self,filename: str, fid = None):
         """
         Opens a new GDS file for writing. To close, call close_library()
 
@@ -175,13 +176,20 @@ class GDSWriter:
         ----------
         filename : str
             The name of the file to write into.
+        fid : file object, optional
+            An already opened binary file to write into (e.g. with a large buffer).
+            In this case filename is only used as library name. The file is
+            closed by close_library(). The default is None.
 
         Returns
         -------
         None.
 
         """
-        self.fid = open(filename,"wb")
+        if(fid is None):
+            self.fid = open(filename,"wb")
+        else:
+            self.fid = fid
         #Write header
         lt=time.localtime(time.time())
         buf = np.array([6,2,3,28,258,lt.tm_year,lt.tm_mon,lt.tm_mday,lt.tm_hour,lt.tm_min,lt.tm_sec,lt.tm_year,lt.tm_mon,lt.tm_mday,lt.tm_hour,lt.tm_min,lt.tm_sec]);
@@ -362,6 +370,11 @@ class GDSWriter:
         pos = self.fid.tell()
         buf = np.zeros(2048-pos%2048,dtype=int);
         self.fid.write(struct.pack("%sb" % buf.size,*buf))
+        self.fid.flush()
+        try:
+            os.fsync(self.fid.fileno()) # single sync once all data is written
+        except OSError:
+            pass # not a disk file
         print('Writing to GDS complete.')
         self.fid.close()
         
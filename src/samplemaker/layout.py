@@ -96,8 +96,14 @@ from samplemaker.gdsreader import GDSReader
 from samplemaker.devices import Device
 from samplemaker import LayoutPool, _DevicePool, _DeviceCountPool, _DeviceLocalParamPool, _BoundingBoxPool
 import pickle # for cacheing
+import mmap
 from copy import deepcopy
 import math
+import numpy as np
+from samplemaker._kernels import _align_positions
+
+# Number of columns and rows of the marker array for each MarkerSet size
+_MSET_GRID = {1:(1,1), 2:(2,1), 4:(2,2)}
 
 class Marker:
     """
@@ -190,13 +196,9 @@ class MarkerSet(Marker):
         self.dev.use_references=True
         g = self.dev.run()
         sref = g.group[0]
-        if(self.mset==2):
-            aref = make_aref(self.x0, self.y0, sref.cellname, sref.group, 2, 1, self.xdist, 0, 0, self.ydist)
-            return aref
-        
-        if(self.mset==4):
-            aref = make_aref(self.x0, self.y0, sref.cellname, sref.group, 2, 2, self.xdist, 0, 0, self.ydist)
-            return aref
+        if(self.mset in _MSET_GRID):
+            (cols,rows) = _MSET_GRID[self.mset]
+            return make_aref(self.x0, self.y0, sref.cellname, sref.group, cols, rows, self.xdist, 0, 0, self.ydist)
         return g
 
 class DeviceTableAnnotations:
@@ -276,10 +278,34 @@ class DeviceTableAnnotations:
         """
         self.to_poly = to_poly
     
+    def _precompute_values(self, rowdict: dict, coldict: dict):
+        """
+        Formats the row and column variable values once per table, so that
+        `render` does not have to round and convert them for every element.
+        The formatted values are used by `render` only as long as it receives
+        the same dictionaries. This function should not be called by the user.
+
+        Parameters
+        ----------
+        rowdict : dict
+            The dictionary associating the variables and values that change along rows.
+        coldict : dict
+            The dictionary associating the variables and values that change along columns.
+
+        Returns
+        -------
+        None.
+
+        """
+        self._col_fmt_vals = [[str(round(rval*1000)/1000) for rval in coldict[var]] for var in self.colvars]
+        self._row_fmt_vals = [[str(round(rval*1000)/1000) for rval in rowdict[var]] for var in self.rowvars]
+        self._fmt_src = (rowdict, coldict)
+    
     def render(self,i: int,j: int,rows: int,cols: int,x0: float,y0: float, rowdict: dict, coldict: dict)-> GeomGroup:
         """
         Renders the text for a given element in a table. This function should not be called
         by the user. It is intended to be run by the DeviceTable functions.
+        Text objects are returned, the conversion to polygons is done by the table.
 
         Parameters
         ----------
@@ -312,18 +338,19 @@ class DeviceTableAnnotations:
         rowtxt = rowtxt.replace("%I",str(i))
         coltxt = coltxt.replace("%J",str(j))
         rowtxt = rowtxt.replace("%J",str(j))
+        src = getattr(self,"_fmt_src",None)
+        if(src is None or src[0] is not rowdict or src[1] is not coldict):
+            self._precompute_values(rowdict, coldict)
         for v in range(len(self.colvars)):
             pstr = "%C"+str(v)
-            rval = coldict[self.colvars[v]][j]
-            rval = round(rval*1000)/1000
-            coltxt = coltxt.replace(pstr,str(rval))
-            rowtxt = rowtxt.replace(pstr,str(rval))
+            sval = self._col_fmt_vals[v][j]
+            coltxt = coltxt.replace(pstr,sval)
+            rowtxt = rowtxt.replace(pstr,sval)
         for v in range(len(self.rowvars)):
             pstr = "%R"+str(v)
-            rval = rowdict[self.rowvars[v]][i]
-            rval = round(rval*1000)/1000
-            coltxt = coltxt.replace(pstr,str(rval))
-            rowtxt = rowtxt.replace(pstr,str(rval))  
+            sval = self._row_fmt_vals[v][i]
+            coltxt = coltxt.replace(pstr,sval)
+            rowtxt = rowtxt.replace(pstr,sval)  
         g = GeomGroup();
         if(self.left and j==0):
             x = x0-self.xoff
@@ -341,8 +368,6 @@ class DeviceTableAnnotations:
             x = x0
             y = y0-self.yoff
             g+= make_text(x,y,coltxt,self.text_height,self.text_width)
-        if(self.to_poly):
-            g.all_to_poly()
         return g        
 
 class DeviceTable:
@@ -397,6 +422,7 @@ class DeviceTable:
         self.pos_xy =  tuple([tuple([(0,0) for i in range(ncol)]) for j in range(nrow)]) # A colsxrows tuple of coordinates for placing the elements
         self._external_ports = dict() # Stores the output ports 
         self._geometries=[]
+        self._built=False # True once __build_geomarray has run
         self._portmap=[]
         self._backup_dev = deepcopy(dev) # Keep it to reset the whole thing
         self._getgeom_ran = False
@@ -418,7 +444,7 @@ class DeviceTable:
 
         """
         self.pos_xy = positions
-        self._geometries=[]
+        self._built=False
         self._portmap=[]
 
     def shift_table_origin(self, dx: float, dy: float):
@@ -479,7 +505,7 @@ class DeviceTable:
 
         """
         self.device_rotation=device_rotation
-        self._geometries=[]
+        self._built=False
         self._portmap=[]
         
     def set_annotations(self, annotations: DeviceTableAnnotations):
@@ -531,10 +557,11 @@ class DeviceTable:
                dev.use_references = self.use_references
                self._geometries[j][i]=dev.run()
                self._portmap[j][i] = deepcopy(dev._ports)
+        self._built = True
                
     def __place_portmap(self):
         # Adjusts the portmap according to the current positions
-        if(self._geometries==[]):
+        if(not self._built):
             self.__build_geomarray()
         
         for i in range(self.ncol): 
@@ -569,43 +596,39 @@ class DeviceTable:
         None.
 
         """
-        if(self._geometries==[]):
+        if(not self._built):
             self.__build_geomarray()
         
         # Get all BB (NOTE: this is slow for large devices with lots of features)
-        bboxes = [[self._geometries[j][i].bounding_box() for i in range(self.ncol)] for j in range(self.nrow)]
-        self.pos_xy = [[[0,0] for i in range(self.ncol)] for j in range(self.nrow)]
+        # Cells sharing the same row and column parameters have the same bounding box,
+        # unless they were already placed by get_geometries.
+        colkeys = [tuple(v[i] if len(v)==self.ncol else v[0] for v in self.colvars.values()) for i in range(self.ncol)]
+        rowkeys = [tuple(v[j] if len(v)==self.nrow else v[0] for v in self.rowvars.values()) for j in range(self.nrow)]
+        bbcache = dict()
+        bboxes = [[None for i in range(self.ncol)] for j in range(self.nrow)]
+        for j in range(self.nrow):
+            for i in range(self.ncol):
+                key = (colkeys[i],rowkeys[j])
+                try:
+                    bb = bbcache.get(key)
+                except TypeError: # unhashable parameter values
+                    key = None
+                    bb = None
+                if(bb is None or self._getgeom_ran):
+                    bb = self._geometries[j][i].bounding_box()
+                    if(key is not None):
+                        bbcache[key]=bb
+                bboxes[j][i] = bb
         # Place them according to the numkey point
-        x_extrR = [-1e23 for i in range(self.ncol)]
-        x_extrL = [1e23 for i in range(self.ncol)]
-        y_extrT = [-1e23 for i in range(self.nrow)]
-        y_extrB = [1e23 for i in range(self.nrow)]
-        for i in range(self.ncol):
-            for j in range(self.nrow):
-                (bx,by) = bboxes[j][i].get_numkey_point(numkey)
-                self.pos_xy[j][i][0]=-bx
-                self.pos_xy[j][i][1]=-by
-                bboxes[j][i].llx-=bx
-                bboxes[j][i].lly-=by
-                if(bboxes[j][i].urx()>x_extrR[i]): x_extrR[i] = bboxes[j][i].urx()         
-                if(bboxes[j][i].ury()>y_extrT[j]): y_extrT[j] = bboxes[j][i].ury()
-                if(bboxes[j][i].llx<x_extrL[i]): x_extrL[i] = bboxes[j][i].llx     
-                if(bboxes[j][i].lly<y_extrB[j]): y_extrB[j] = bboxes[j][i].lly
-        
-        #print(x_extrR,x_extrL,y_extrT,y_extrB)
-        
-        sx = [(x_extrR[i-1]-x_extrL[i]+min_dist_x) for i in range(1,self.ncol)]
-        sy = [(y_extrT[j-1]-y_extrB[j]+min_dist_y) for j in range(1,self.nrow)]
-        #print(sx,sy)
-
-        for i in range(self.ncol):
-            for j in range(self.nrow):
-                #print(self.pos_xy[j][i])
-                if(i!=0):
-                    self.pos_xy[j][i][0]+=sum(sx[0:i])
-                if(j!=0):
-                    self.pos_xy[j][i][1]+=sum(sy[0:j])
-                #print(self.pos_xy[j][i])
+        llx = np.array([[bb.llx for bb in row] for row in bboxes],dtype=np.float64)
+        lly = np.array([[bb.lly for bb in row] for row in bboxes],dtype=np.float64)
+        urx = np.array([[bb.urx() for bb in row] for row in bboxes],dtype=np.float64)
+        ury = np.array([[bb.ury() for bb in row] for row in bboxes],dtype=np.float64)
+        nkp = [[bb.get_numkey_point(numkey) for bb in row] for row in bboxes]
+        bx = np.array([[p[0] for p in row] for row in nkp],dtype=np.float64)
+        by = np.array([[p[1] for p in row] for row in nkp],dtype=np.float64)
+        pos_xy = _align_positions(llx,lly,urx,ury,bx,by,float(min_dist_x),float(min_dist_y))
+        self.pos_xy = pos_xy.tolist()
                   
     
     def get_geometries(self) -> GeomGroup:
@@ -618,26 +641,30 @@ class DeviceTable:
             The rendered table geometry
 
         """
+        self._external_ports.clear()
         if(self._getgeom_ran):
-            self._geometries = []
+            self._built = False
             self._portmap = []
             self.dev = deepcopy(self._backup_dev)
         
-        if(self._geometries==[]):
+        if(not self._built):
             self.__build_geomarray()
         
         self.__place_portmap()
-        g = GeomGroup()
+        out = [] # accumulate shapes in a flat list, GeomGroup += copies the whole group
+        anns = []
         dev = self.dev
         portmap = self._portmap
+        if(self.annotations):
+            self.annotations._precompute_values(self.rowvars,self.colvars)
         for i in range(self.ncol): 
             for j in range(self.nrow):
                 geom = self._geometries[j][i]
                 # The position is already set during __place_portmap()
-                g+=geom
+                out.extend(geom.group)
                 # annotations
                 if(self.annotations):
-                    g+=self.annotations.render(j,i,self.nrow,self.ncol,self.pos_xy[j][i][0],self.pos_xy[j][i][1],self.rowvars,self.colvars)
+                    anns.extend(self.annotations.render(j,i,self.nrow,self.ncol,self.pos_xy[j][i][0],self.pos_xy[j][i][1],self.rowvars,self.colvars).group)
                 
                 # Column linking
                 clports = self.col_linkports
@@ -658,7 +685,7 @@ class DeviceTable:
                                     for pp in portmap[j][i].values():
                                         pp.y0 -= ydiff    
                                                                         
-                                g+=p1.connector_function(p1,p2)                                
+                                out.extend(p1.connector_function(p1,p2).group)                                
                             else:
                                 print("Warning, incompatible ports for connection between",p1.name,
                                       "and",p2.name)              
@@ -675,7 +702,7 @@ class DeviceTable:
                                     geom.translate(0,-xdiff)
                                     for pp in portmap[j][i].values():
                                         pp.x0 -= xdiff    
-                                g+=p1.connector_function(p1,p2)
+                                out.extend(p1.connector_function(p1,p2).group)
                             else:
                                 print("Warning, incompatible ports for connection between",p1.name,
                                       "and",p2.name)             
@@ -686,6 +713,14 @@ class DeviceTable:
                     p1.name+="_%i_%i"%(j,i)
                     self._external_ports[p1.name]=p1
         self._getgeom_ran = True
+        if(self.annotations):
+            ann = GeomGroup()
+            ann.group = anns
+            if(self.annotations.to_poly):
+                ann.all_to_poly() # convert all the annotations in one pass
+            out.extend(ann.group)
+        g = GeomGroup()
+        g.group = out
         return g
    
     @staticmethod
@@ -740,7 +775,7 @@ class Mask:
         """
         self.name=name
         self.mainsymbol = "CELL00"
-        self.writefields=[]
+        self.writefields=[] # one tuple (wf_size,x0,y0,passes,shift) per writefield
         self.cache=False
         self.clear()  # A new mask clears the pool
                 
@@ -811,9 +846,8 @@ class Mask:
 
         """
         if self.mainsymbol not in LayoutPool:
-            LayoutPool[self.mainsymbol] = geom_group
-        else:
-            LayoutPool[self.mainsymbol] += geom_group
+            LayoutPool[self.mainsymbol] = GeomGroup()
+        LayoutPool[self.mainsymbol] += geom_group
         
     def addCell(self, cellname: str, geom_group: GeomGroup):
         """
@@ -857,7 +891,7 @@ class Mask:
         
     def __exportCache(self):
         print("Storing objects in cache file")
-        cachefile=open(self.name+".cache","wb")
+        cachefile=open(self.name+".cache","wb",buffering=1<<20)
         # Note that we do not need the full geometry, as we will just reload
         # it from the GDS file. So we keep the references only.
         # We might, however, need to re-compute the bounding boxes
@@ -868,7 +902,7 @@ class Mask:
                 
             
         data = (LayoutPool,_DeviceCountPool,_DeviceLocalParamPool,_DevicePool,_BoundingBoxPool)
-        pickle.dump(data,cachefile)
+        pickle.dump(data,cachefile,protocol=pickle.HIGHEST_PROTOCOL)
         cachefile.close()
         print("Done.")
         
@@ -876,19 +910,20 @@ class Mask:
         try:
             with open(self.name+".cache","rb") as cachefile:
                 print("Loading cache data")
-                data = pickle.load(cachefile)
+                try:
+                    # map the file in memory instead of reading it through the file buffer
+                    with mmap.mmap(cachefile.fileno(),0,access=mmap.ACCESS_READ) as mm:
+                        data = pickle.loads(mm)
+                except (OSError, ValueError): # e.g. empty file or no mmap support
+                    cachefile.seek(0)
+                    data = pickle.load(cachefile)
                 print("Done")
-                for key in data[0].keys():
-                    LayoutPool[key]=data[0][key]
+                LayoutPool.update(data[0])
                 LayoutPool.pop(self.mainsymbol,None)
-                for key in data[1].keys():
-                    _DeviceCountPool[key]=data[1][key]
-                for key in data[2].keys():
-                    _DeviceLocalParamPool[key]=data[2][key]
-                for key in data[3].keys():                
-                    _DevicePool[key]=data[3][key]
-                for key in data[4].keys():                
-                    _BoundingBoxPool[key]=data[4][key]
+                _DeviceCountPool.update(data[1])
+                _DeviceLocalParamPool.update(data[2])
+                _DevicePool.update(data[3])
+                _BoundingBoxPool.update(data[4])
         except IOError:
             pass
     
@@ -898,17 +933,10 @@ class Mask:
         reflist = LayoutPool[self.mainsymbol].get_sref_list(reflist)
         reflist.add(self.mainsymbol)
         
-        unref=[]
-        unref_hsh=[]
-        for ref in LayoutPool.keys():
-            if ref not in reflist:
-                unref+=[ref]
-       
+        unref = set(LayoutPool) - reflist
         for ref in unref:
-            LayoutPool.pop(ref,None)
-        for key,value in _DevicePool.items():
-            if value in unref:
-                unref_hsh+=[key]
+            del LayoutPool[ref]
+        unref_hsh = [key for key,value in _DevicePool.items() if value in unref]
                 
         for hsh in unref_hsh:
             #_DeviceCountPool.pop(hsh,None)
@@ -926,6 +954,7 @@ class Mask:
 
         """
     
+        self.__place_writefields()
         self.__cleanup_cellref()
         if(self.cache): 
             try:
@@ -936,7 +965,8 @@ class Mask:
                 pass
             
         gdsw = GDSWriter()
-        gdsw.open_library(self.name + ".gds")
+        gdsfile = open(self.name + ".gds","wb",buffering=16*1024*1024)
+        gdsw.open_library(self.name + ".gds",gdsfile)
         if(self.cache):
             gdsw.write_pool_use_cache(LayoutPool,gdsr.celldata)
         else:
@@ -1009,14 +1039,38 @@ class Mask:
         """
         g = markerset.get_geom()
         if self.mainsymbol not in LayoutPool:
-            LayoutPool[self.mainsymbol] = g
-        else:
-            LayoutPool[self.mainsymbol] += g
+            LayoutPool[self.mainsymbol] = GeomGroup()
+        LayoutPool[self.mainsymbol] += g
+            
+    def __place_writefields(self):
+        # Places all the writefields added with addWriteField in one batch,
+        # each writefield is a reference to the outline cell of its size
+        if(len(self.writefields)==0):
+            return
+        wf = np.array(self.writefields,dtype=np.float64)
+        wfs = GeomGroup()
+        for s in np.unique(wf[:,0]):
+            cellname = self.__writefield_cell(float(s))
+            cellgroup = LayoutPool[cellname]
+            sel = wf[:,0]==s
+            wfs.group += [SRef(x,y,cellname,cellgroup,1,0,False) for (x,y) in
+                          zip(wf[sel,1].tolist(),wf[sel,2].tolist())]
+        self.addToMainCell(wfs)
+        self.writefields.clear()
+    
+    def __writefield_cell(self, wf_size: float) -> str:
+        # Returns the name of the cell with a single writefield outline, creates it if needed
+        cellname = "_WF%i" % round(wf_size*1000)
+        if cellname not in LayoutPool:
+            s = wf_size
+            self.addCell(cellname,make_path([-s/2,s/2,s/2,-s/2,-s/2],[-s/2,-s/2,s/2,s/2,-s/2],0.1,layer=10))
+        return cellname
             
     def addWriteField(self, wf_size: float, x0: float, y0: float, 
                       passes: int = 1, shift: float = 0):
         '''
         Add a square writefield centered in x0,y0. 
+        All writefields are drawn together in the main cell when the mask is exported.
 
         Parameters
         ----------
@@ -1036,7 +1090,7 @@ class Mask:
         None.
 
         '''
-        self.writefields+=[(wf_size,x0,y0,passes,shift)];
+        self.writefields.append((wf_size,x0,y0,passes,shift))
 
     
     def addWriteFieldGrid(self, wf_size: float, x0: float, y0:float,
@@ -1066,21 +1120,11 @@ class Mask:
         None.
 
         '''
-        for i in range(Nx):
-            for j in range(Ny):
-                self.addWriteField(wf_size, i*wf_size+x0, j*wf_size+y0,passes,shift)
-        
-        # Adding writefields
-        if(len(self.writefields)>0):
-            wfs = GeomGroup()
-            for wf in self.writefields:
-                s = wf[0]
-                x = wf[1]
-                y = wf[2]
-                wfpath=make_path([-s/2,s/2,s/2,-s/2,-s/2],[-s/2,-s/2,s/2,s/2,-s/2],0.1,layer=10)
-                wfpath.translate(x, y)
-                wfs+=wfpath
-            self.addToMainCell(wfs)
+        # All fields in the grid are identical: use a single array reference
+        if(Nx>0 and Ny>0):
+            cellname = self.__writefield_cell(wf_size)
+            self.addToMainCell(make_aref(x0, y0, cellname, LayoutPool[cellname], Nx, Ny,
+                                         wf_size, 0, 0, wf_size))
         
                 
     def addDeviceTable(self, device_table: DeviceTable, x0: float, y0: float, cell: str = ""):
@@ -16,8 +16,10 @@ directly.
 """
 
 import math
+import numpy as np
+from functools import lru_cache
 import samplemaker.shapes as smsh
-from samplemaker.shapes import GeomGroup
+from samplemaker.shapes import GeomGroup, _NUMKEY_XOFF, _NUMKEY_YOFF
 from typing import List
   
 def make_dot(x0: float, y0: float)-> "smsh.Dot":
@@ -141,9 +143,9 @@ def make_text(x0: float,y0: float,text: str,
 
     """
     g = GeomGroup();
-    if(numkey<1 | numkey>9): numkey = 5
-    posu = (numkey-1)%3
-    posv = math.floor((9-numkey)/3)
+    if(numkey<1 or numkey>9): numkey = 5
+    posu = 1-_NUMKEY_XOFF[numkey]
+    posv = 1+_NUMKEY_YOFF[numkey]
     txt=smsh.Text(x0,y0,text,posu,posv,height,width,angle,layer)
     if(to_poly==1):
         g = txt.to_polygon()
@@ -228,6 +230,47 @@ def make_aref(x0: float, y0: float, cellname: str, group: "GeomGroup",
     g.add(smsh.ARef(x0, y0, cellname, group, ncols, nrows, ax, ay, bx, by, mag, angle, mirror))
     return g
 
+@lru_cache(maxsize=4096)
+def _cached_polygon_data(kind: str, args: tuple, vertices: int, split: bool = False) -> tuple:
+    # Polygon data of a shape centered in the origin, cached by shape parameters.
+    # Returns a tuple of read-only data arrays (one per polygon).
+    if(kind=="circle"):
+        g = smsh.Circle(0,0,args[0],0).to_polygon(vertices)
+    elif(kind=="ellipse"):
+        g = smsh.Ellipse(0,0,args[0],args[1],0,args[2]).to_polygon(vertices)
+    elif(kind=="ring"):
+        g = smsh.Ring(0,0,args[0],args[1],0,args[2],args[3]).to_polygon(vertices)
+    elif(kind=="arc"):
+        g = smsh.Arc(0,0,args[0],args[1],0,args[2],args[3],args[4],args[5]).to_polygon(vertices,split)
+    elif(kind=="rounded_rect"):
+        (width,height,corner_radius) = args
+        g = make_poly([-width/2,width/2,width/2,-width/2],
+                      [-height/2,-height/2,height/2,height/2],0)
+        g.poly_resize(corner_radius, 0, corner_radius>0, vertices*4)
+        bb1 = g.bounding_box()
+        g.scale(0,0,(width+2*corner_radius)/bb1.width,(height+2*corner_radius)/bb1.height)
+    datalist = []
+    for p in g.group:
+        data = np.copy(p.data)
+        data.flags.writeable = False
+        datalist.append(data)
+    return tuple(datalist)
+
+def _polygons_from_cache(x0: float, y0: float, layer: int, kind: str, args: tuple,
+                         vertices: int, split: bool = False) -> 'GeomGroup':
+    # Creates new polygons in x0,y0 from the cached data
+    try:
+        datalist = _cached_polygon_data(kind,args,vertices,split)
+    except TypeError: # unhashable parameters, skip the cache
+        datalist = _cached_polygon_data.__wrapped__(kind,args,vertices,split)
+    g = GeomGroup()
+    for data in datalist:
+        p = smsh.Poly([],[],layer)
+        p.set_data(data.copy())
+        p.translate(x0,y0)
+        g.group.append(p)
+    return g
+
 def make_circle(x0: float,y0: float,r: float,layer: int = 1, 
                 to_poly: bool = False, vertices: int = 32) -> 'GeomGroup':
     """
@@ -255,12 +298,11 @@ def make_circle(x0: float,y0: float,r: float,layer: int = 1,
         A geometry containing a single circle.
 
     """
+    if (to_poly):
+        return _polygons_from_cache(x0,y0,layer,"circle",(r,),vertices)
     g = GeomGroup()
     c = smsh.Circle(x0,y0,r,layer)
-    if (to_poly):
-        g = c.to_polygon(vertices)
-    else:
-        g.add(c)
+    g.add(c)
     return g
     
 def make_ellipse(x0: float,y0: float,rX: float,rY: float, 
@@ -295,12 +337,11 @@ def make_ellipse(x0: float,y0: float,rX: float,rY: float,
         A geometry containing a single ellipse.
 
     """
+    if (to_poly):
+        return _polygons_from_cache(x0,y0,layer,"ellipse",(rX,rY,rot),vertices)
     g = GeomGroup()
     c = smsh.Ellipse(x0,y0,rX,rY,layer,rot)
-    if (to_poly):
-        g = c.to_polygon(vertices)
-    else:
-        g.add(c)
+    g.add(c)
     return g
 
 def make_ring(x0: float,y0: float,rX: float,rY: float,
@@ -338,12 +379,11 @@ def make_ring(x0: float,y0: float,rX: float,rY: float,
         A geometry containing a single ring.
 
     """
+    if (to_poly):
+        return _polygons_from_cache(x0,y0,layer,"ring",(rX,rY,rot,w),vertices)
     g = GeomGroup()
     c=smsh.Ring(x0,y0,rX,rY,layer,rot,w)
-    if (to_poly):
-        g = c.to_polygon(vertices)
-    else:
-        g.add(c)
+    g.add(c)
     return g
 
 def make_arc(x0: float,y0: float,rX: float,rY: float,
@@ -389,12 +429,11 @@ def make_arc(x0: float,y0: float,rX: float,rY: float,
         A geometry containing a single ring.
 
     """
+    if (to_poly):
+        return _polygons_from_cache(x0,y0,layer,"arc",(rX,rY,rot,w,a1,a2),vertices,split)
     g = GeomGroup()
     c=smsh.Arc(x0,y0,rX,rY,layer,rot,w,a1,a2)
-    if (to_poly):
-        g = c.to_polygon(vertices,split)
-    else:
-        g.add(c)
+    g.add(c)
     return g
 
 
@@ -431,13 +470,11 @@ def make_rect(x0: float,y0: float,width: float,
         A geometry containing a single rectangle.
 
     """
-    r1 = make_poly([x0-width/2,x0+width/2,x0+width/2,x0-width/2],
-                   [y0-height/2,y0-height/2,y0+height/2,y0+height/2],layer);
-    if(numkey!=5):
-        xoff = -((numkey-1)%3-1)
-        yoff = math.floor((9-numkey)/3)-1
-        r1.translate(xoff*width/2,yoff*height/2)
-    
+    if(numkey!=5 and 1<=numkey<=9):
+        x0 += _NUMKEY_XOFF[numkey]*width/2
+        y0 += _NUMKEY_YOFF[numkey]*height/2
+    r1 = GeomGroup()
+    r1.group.append(smsh.Poly.from_rect(x0-width/2,y0-height/2,width,height,layer))
     return r1
 
 def make_rounded_rect(x0: float,y0: float,width: float,
@@ -478,20 +515,12 @@ def make_rounded_rect(x0: float,y0: float,width: float,
         A geometry containing a single rectangle.
 
     """
-    w0 = width
-    h0 = height
     width=width-2*corner_radius
     height=height-2*corner_radius
-    r1 = make_poly([x0-width/2,x0+width/2,x0+width/2,x0-width/2],
-                   [y0-height/2,y0-height/2,y0+height/2,y0+height/2],layer);
-    
-    r1.poly_resize(corner_radius, layer, corner_radius>0, resolution*4)
-    bb1 = r1.bounding_box()
-    r1.scale(x0,y0,w0/bb1.width,h0/bb1.height)
-    if(numkey!=5):
-        xoff = -((numkey-1)%3-1)
-        yoff = math.floor((9-numkey)/3)-1
-        r1.translate(xoff*(width+2*corner_radius)/2,yoff*(height+2*corner_radius)/2)
+    r1 = _polygons_from_cache(x0,y0,layer,"rounded_rect",(width,height,corner_radius),resolution)
+    if(numkey!=5 and 1<=numkey<=9):
+        r1.translate(_NUMKEY_XOFF[numkey]*(width+2*corner_radius)/2,
+                     _NUMKEY_YOFF[numkey]*(height+2*corner_radius)/2)
     return r1
 
 def make_tapered_path(xpts: List[float],ypts: List[float],
@@ -529,56 +558,18 @@ def make_tapered_path(xpts: List[float],ypts: List[float],
         p1.translate(x[0],y[0])
     if(Npts==2):
         ang1 = math.atan2(y[1]-y[0],x[1]-x[0]);
-        c1 = 1/2*math.cos(ang1-math.pi/2);
-        c2 = 1/2*math.cos(ang1+math.pi/2);
-        s1 = 1/2*math.sin(ang1-math.pi/2);
-        s2 = 1/2*math.sin(ang1+math.pi/2);
+        ca = 0.5*math.cos(ang1)
+        sa = 0.5*math.sin(ang1)
+        c1 = sa  # cos(ang1-pi/2)/2
+        c2 = -sa # cos(ang1+pi/2)/2
+        s1 = -ca # sin(ang1-pi/2)/2
+        s2 = ca  # sin(ang1+pi/2)/2
         p1.set_points([x[0]+c1*w[0],x[1]+c1*w[1],x[1]+c2*w[1],x[0]+c2*w[0]],
                       [y[0]+s1*w[0],y[1]+s1*w[1],y[1]+s2*w[1],y[0]+s2*w[0]])
 
     if(Npts>2):
-        xp1 = []
-        yp1 = []
-        xp2 = []
-        yp2 = []
-        for j in range(1,Npts-1):
-            ang1 = math.atan2(y[j]-y[j-1],x[j]-x[j-1])
-            ang2 = math.atan2(y[j+1]-y[j],x[j+1]-x[j])
-            d = (x[j+1]-x[j-1])*(y[j]-y[j-1])\
-                - (y[j+1]-y[j-1])*(x[j]-x[j-1])
-            if(j==1):
-                xp1.append(x[j-1]+w[j-1]/2*math.cos(ang1-math.pi/2));
-                yp1.append(y[j-1]+w[j-1]/2*math.sin(ang1-math.pi/2));
-                xp2.append(x[j-1]+w[j-1]/2*math.cos(ang1+math.pi/2));
-                yp2.append(y[j-1]+w[j-1]/2*math.sin(ang1+math.pi/2));
-                
-            if(d<0):
-                xp1.append(x[j]+w[j]/2*math.cos(ang1-math.pi/2));
-                yp1.append(y[j]+w[j]/2*math.sin(ang1-math.pi/2));
-                xp1.append(x[j]+w[j]/2*math.cos(ang2-math.pi/2));
-                yp1.append(y[j]+w[j]/2*math.sin(ang2-math.pi/2));
-                wx = w[j]/2/math.cos((ang2-ang1)/2);
-                a0 = math.pi/2-(ang1+ang2)/2;
-                xp2.append(x[j]-wx*math.cos(a0));
-                yp2.append(y[j]+wx*math.sin(a0));
-            else:
-                xp2.append(x[j]+w[j]/2*math.cos(ang1+math.pi/2));
-                yp2.append(y[j]+w[j]/2*math.sin(ang1+math.pi/2));
-                xp2.append(x[j]+w[j]/2*math.cos(ang2+math.pi/2));
-                yp2.append(y[j]+w[j]/2*math.sin(ang2+math.pi/2));
-                wx = w[j]/2/math.cos((ang2-ang1)/2);
-                a0 = math.pi/2-(ang1+ang2)/2;
-                xp1.append(x[j]+wx*math.cos(a0));
-                yp1.append(y[j]-wx*math.sin(a0));
-            if(j==Npts-2):
-                xp1.append(x[j+1]+w[j+1]/2*math.cos(ang2-math.pi/2));
-                yp1.append(y[j+1]+w[j+1]/2*math.sin(ang2-math.pi/2));
-                xp2.append(x[j+1]+w[j+1]/2*math.cos(ang2+math.pi/2));
-                yp2.append(y[j+1]+w[j+1]/2*math.sin(ang2+math.pi/2));
-        
-        xp2.reverse()
-        yp2.reverse()
-        p1.set_points(xp1+xp2,yp1+yp2)
+        (xp,yp) = smsh._path_outline(x,y,w)
+        p1.set_points(xp,yp)
     g = GeomGroup();
     g.add(p1)
     return g
@@ -31,12 +31,35 @@ with the designed parameters.
 """
 
 import samplemaker.makers as sm
-from samplemaker.shapes import GeomGroup
+from samplemaker.shapes import GeomGroup, Circle, SRef
 import math
 import numpy as np
 from typing import List
 from samplemaker.layout import LayoutPool
-from copy import deepcopy
+
+def _hexagonal_rings(rings):
+    # Sites of the hexagonal rings with the given radii, each ring is walked
+    # counter-clockwise along its six sides starting from the corner at (r,0)
+    rings = np.asarray(rings,dtype=np.int64)
+    counts = 6*rings
+    r = np.repeat(rings,counts)
+    j = np.arange(r.size)-np.repeat(np.cumsum(counts)-counts,counts)
+    side = j//r
+    k = j%r
+    cx = r*np.cos(np.radians(60*side))
+    cy = r*np.sin(np.radians(60*side))
+    cx1 = r*np.cos(np.radians(60*(side+1)))
+    cy1 = r*np.sin(np.radians(60*(side+1)))
+    xpts = k*((cx1-cx)/r)+cx
+    ypts = (cy1-cy)/(cx1-cx)*(xpts-cx)+cy
+    return xpts,ypts
+
+def _sorted_unique(x):
+    # Same as np.unique but sorts in place and skips the extra copy
+    x.sort()
+    if(x.size==0):
+        return x
+    return x[np.concatenate(([True],x[1:]!=x[:-1]))]
 
 class Crystal:
     def __init__(self,xpts: List[float] =[],ypts: List[float] = [],params: List[float]=[]):
@@ -62,7 +85,8 @@ class Crystal:
         self.xpts = xpts
         self.ypts = ypts
         if(type(params)==np.ndarray):
-            params=np.float64(params)
+            # Fortran order keeps the parameters of one site contiguous
+            params=np.asfortranarray(params,dtype=np.float64)
         self.params = params
         
     def remove_at_index(self, index: List[int]):
@@ -82,7 +106,7 @@ class Crystal:
         if len(index)>0:  
             self.xpts=np.delete(self.xpts, index)
             self.ypts=np.delete(self.ypts, index)
-            self.params=np.delete(self.params, index,axis=1)
+            self.params=np.asfortranarray(np.delete(self.params, index,axis=1))
     
     def shift_at_index(self, index: List[int], shift_x: float, shift_y: float,
                        relative: bool = False, orig_x: float = 0, orig_y: float = 0):
@@ -109,13 +133,16 @@ class Crystal:
         None.
 
         """
-        if len(index)>0:
+        idx = np.asarray(index,dtype=np.intp).reshape(-1)
+        if idx.size>0:
+            xs = self.xpts[idx]
+            ys = self.ypts[idx]
             if(relative):               
-                self.xpts[index] = self.xpts[index]+(2.0*(self.xpts[index]>orig_x)-1)*shift_x
-                self.ypts[index] = self.ypts[index]+(2.0*(self.ypts[index]>orig_y)-1)*shift_y
+                self.xpts[idx] = xs+np.where(xs>orig_x,shift_x,-shift_x)
+                self.ypts[idx] = ys+np.where(ys>orig_y,shift_y,-shift_y)
             else:
-                self.xpts[index] = self.xpts[index]+shift_x
-                self.ypts[index] = self.ypts[index]+shift_y
+                self.xpts[idx] = xs+shift_x
+                self.ypts[idx] = ys+shift_y
     
     def param_at_index(self, index: int, pindex: int, pvalues: float):
         """
@@ -156,19 +183,28 @@ class Crystal:
             A list of coordinate indices.
 
         """
-        if(type(xc)!=np.ndarray):
-            xc = np.array(xc)
-            yc = np.array(yc)
-        sel = []
-        for i in range(xc.size):
-            sx = abs(self.xpts-xc[i])<1e-6
-            sy = abs(self.ypts-yc[i])<1e-6
-            res = np.where(sx&sy);
-            if(res[0].size)==0: 
-                print("defect_at_coord(): warning, no match for ",xc[i],yc[i])
-            else:
-                sel.append(res[0][0])
-        return sel
+        xc = np.atleast_1d(np.asarray(xc,dtype=np.float64))
+        yc = np.atleast_1d(np.asarray(yc,dtype=np.float64))
+        xpts = np.asarray(self.xpts,dtype=np.float64)
+        ypts = np.asarray(self.ypts,dtype=np.float64)
+        nsites = xpts.size
+        # candidate sites are found by bisection on the sorted x-coordinates,
+        # the window is slightly wider than the tolerance checked below
+        order = np.argsort(xpts,kind="stable")
+        xsorted = xpts[order]
+        lo = np.searchsorted(xsorted,xc-2e-6,side="left")
+        cnt = np.searchsorted(xsorted,xc+2e-6,side="right")-lo
+        qi = np.repeat(np.arange(xc.size),cnt)
+        offs = np.arange(qi.size)-np.repeat(np.cumsum(cnt)-cnt,cnt)
+        si = order[np.repeat(lo,cnt)+offs]
+        ok = (np.abs(xpts[si]-xc[qi])<1e-6) & (np.abs(ypts[si]-yc[qi])<1e-6)
+        # keep the lowest matching site index for each query
+        idx = np.full(xc.size,nsites,dtype=np.int64)
+        np.minimum.at(idx,qi[ok],si[ok])
+        found = idx<nsites
+        for i in np.nonzero(~found)[0]:
+            print("defect_at_coord(): warning, no match for ",xc[i],yc[i])
+        return idx[found].tolist()
     
     def remove_crystal(self, crystal: "Crystal"):
         """
@@ -202,7 +238,7 @@ class Crystal:
         """
         self.xpts = np.append(self.xpts,crystal.xpts)
         self.ypts = np.append(self.ypts,crystal.ypts)
-        self.params = np.append(self.params,crystal.params,axis=1)
+        self.params = np.asfortranarray(np.append(self.params,crystal.params,axis=1))
         
     
     def copy(self):
@@ -215,7 +251,7 @@ class Crystal:
             A deepcopy of crystal.
 
         """
-        return deepcopy(self)
+        return type(self)(np.copy(self.xpts),np.copy(self.ypts),np.copy(self.params))
     
     @classmethod
     def triangular_hexagonal(cls,N: int, filled: bool, Nparams: int = 1):
@@ -243,24 +279,14 @@ class Crystal:
         """
         if(N==0):
             return cls(np.array([0]),np.array([0]),np.ones((Nparams,1)))
-        xpts = np.array([])
-        ypts = np.array([])
         
         if(filled):
-            for i in range(0,N):
-                tmpc = cls.triangular_hexagonal(i,False)
-                xpts = np.append(xpts,tmpc.xpts)
-                ypts = np.append(ypts,tmpc.ypts)
+            # center site followed by the rings 1...N-1
+            xpts,ypts = _hexagonal_rings(np.arange(1,N))
+            xpts = np.concatenate(([0.],xpts))
+            ypts = np.concatenate(([0.],ypts))
         else:        
-            th = np.array([e for e in range(0,361,60)])
-            cx = N*np.cos(np.radians(th))
-            cy = N*np.sin(np.radians(th))
-            for i in range(6):
-                xint = np.linspace(cx[i],cx[i+1],N+1)
-                m = (cy[i+1]-cy[i])/(cx[i+1]-cx[i])
-                yint = m*(xint[0:-1:]-cx[i])+cy[i]
-                xpts = np.append(xpts,xint[0:-1:])
-                ypts = np.append(ypts,yint)
+            xpts,ypts = _hexagonal_rings(np.array([N]))
             
         params = np.ones((Nparams,xpts.size));
         return cls(xpts,ypts,params)    
@@ -298,10 +324,9 @@ class Crystal:
         y1 = np.array([e*math.sqrt(3) for e in range(-Ny,Ny+1)])
         x2 = np.array([e+0.5 for e in range(-Nx,Nx)])
         y2 = np.array([math.sqrt(3)/2+math.sqrt(3)*e for e in range(-Ny,Ny)]);
-        X1,Y1 = np.meshgrid(x1,y1)
-        X2,Y2 = np.meshgrid(x2,y2)
-        xpts = np.append(X1.reshape(-1),X2.reshape(-1))
-        ypts = np.append(Y1.reshape(-1),Y2.reshape(-1))
+        # row-major flattening of the two meshgrids
+        xpts = np.concatenate((np.tile(x1,y1.size),np.tile(x2,y2.size)))
+        ypts = np.concatenate((np.repeat(y1,x1.size),np.repeat(y2,x2.size)))
         params = np.ones((Nparams,xpts.size));
         return cls(xpts,ypts,params)
     
@@ -346,24 +371,23 @@ class Crystal:
         Nx = math.ceil(Nx)
     
         for i in range(len(a)):
-            xchunk1=startx+np.array([e for e in range(0,periods[i]+1)])*a[i]
-            xchunk2=startx+(0.5+np.array([e for e in range(0,periods[i])]))*a[i]
+            xchunk1=startx+np.arange(0,periods[i]+1)*a[i]
+            xchunk2=startx+(0.5+np.arange(0,periods[i]))*a[i]
             startx=xchunk1[-1]
-            x1=np.append(x1,xchunk1)
-            x2=np.append(x2,xchunk2)
+            x1.append(xchunk1)
+            x2.append(xchunk2)
   
-        x1=np.append(x1,startx+np.array([e for e in range(0,int(Nx-totalp+1))]));
-        x2=np.append(x2,startx+(0.5 + np.array([e for e in range(0,int(Nx-totalp))])))
-        x1=np.append(x1,-x1[::-1])
-        x2=np.append(x2,-x2[::-1])
-        x1=np.sort(np.unique(x1))
-        x2=np.sort(np.unique(x2))
+        x1.append(startx+np.arange(0,int(Nx-totalp+1)))
+        x2.append(startx+(0.5 + np.arange(0,int(Nx-totalp))))
+        x1=np.concatenate(x1)
+        x2=np.concatenate(x2)
+        x1=_sorted_unique(np.concatenate((x1,-x1[::-1])))
+        x2=_sorted_unique(np.concatenate((x2,-x2[::-1])))
         y1 = np.array([e*math.sqrt(3) for e in range(-Ny,Ny+1)])
         y2 = np.array([math.sqrt(3)/2+math.sqrt(3)*e for e in range(-Ny,Ny)]);
-        X1,Y1 = np.meshgrid(x1,y1)
-        X2,Y2 = np.meshgrid(x2,y2)
-        xpts = np.append(X1.reshape(-1),X2.reshape(-1))
-        ypts = np.append(Y1.reshape(-1),Y2.reshape(-1))
+        # row-major flattening of the two meshgrids
+        xpts = np.concatenate((np.tile(x1,y1.size),np.tile(x2,y2.size)))
+        ypts = np.concatenate((np.repeat(y1,x1.size),np.repeat(y2,x2.size)))
         params = np.ones((Nparams,xpts.size));
         heterophc = cls(xpts,ypts,params)
         if (Ny != 0):
@@ -392,6 +416,33 @@ def __circref_cellfun__(x,y,params):
     else:
         return sm.make_sref(x, y, "_CIRCLE",LayoutPool["_CIRCLE"],mag=params[0])
 
+def _scaled_sites(crystal: "Crystal", scaling: float, cellparams: List[float], nargs: int):
+    # Scaled site coordinates and cell parameters, params has shape (nargs,Nsites)
+    xs = np.asarray(crystal.xpts,dtype=np.float64)*scaling
+    ys = np.asarray(crystal.ypts,dtype=np.float64)*scaling
+    if(xs.size==0):
+        return xs,ys,np.zeros((nargs,0))
+    params = np.atleast_2d(np.asarray(crystal.params,dtype=np.float64))
+    if(params.shape[0]<nargs or len(cellparams)<nargs):
+        raise IndexError(f"Cell function requires {nargs} parameters, crystal has {params.shape[0]} "
+                         f"and {len(cellparams)} cell parameters were given")
+    cp = np.asarray(cellparams[:nargs],dtype=np.float64)
+    ps = params[:nargs,:]*cp[:,None]
+    return xs,ys,ps
+
+def _circles_at_sites(xs, ys, rs, x0: float, y0: float):
+    # Bulk version of the default cell function, builds all circles at once
+    phc = GeomGroup()
+    phc.group = [Circle(x,y,r,0) for x,y,r in zip((xs+x0).tolist(),(ys+y0).tolist(),rs.tolist())]
+    return phc
+
+def _circrefs_at_sites(xs, ys, rs, x0: float, y0: float):
+    # Bulk version of the reference cell function, all sites share the _CIRCLE cell
+    circ = LayoutPool["_CIRCLE"]
+    phc = GeomGroup()
+    phc.group = [SRef(x,y,"_CIRCLE",circ,r,0,0) for x,y,r in zip((xs+x0).tolist(),(ys+y0).tolist(),rs.tolist())]
+    return phc
+
 def make_phc(crystal: "Crystal", scaling: float, cellparams: List[float], x0: float, y0: float, 
              cellfun = __circ_cellfun__, name: str = ""):
     """
@@ -412,7 +463,8 @@ def make_phc(crystal: "Crystal", scaling: float, cellparams: List[float], x0: fl
     cellfun : TYPE, optional
         A function of the type fun(x,y,params) that returns the geometry of the unit cell.
         It should also return the number of parameters required to draw the unit cell if "test" is passed as params. 
-        The default is __circ_cellfun__.
+        The default is __circ_cellfun__. For large crystals consider __circref_cellfun__, which
+        places references to a single circle cell instead of one circle per site.
     name : str, optional
         Name of the crystal. The default is "".
 
@@ -424,13 +476,16 @@ def make_phc(crystal: "Crystal", scaling: float, cellparams: List[float], x0: fl
     """
     nargs = cellfun(0,0,"test");
     phc = GeomGroup();
-    for i in range(len(crystal.xpts)):
-        xpos = crystal.xpts[i]*scaling
-        ypos = crystal.ypts[i]*scaling
-        params = [0.]*nargs
-        for j in range(nargs):
-            params[j] = crystal.params[j,i]*cellparams[j]
-        phc+=cellfun(xpos,ypos,params)   
+    xs,ys,ps = _scaled_sites(crystal,scaling,cellparams,nargs)
+    if(cellfun is __circ_cellfun__):
+        return _circles_at_sites(xs,ys,ps[0],x0,y0)
+    if(cellfun is __circref_cellfun__):
+        return _circrefs_at_sites(xs,ys,ps[0],x0,y0)
+    # extend a single list, phc+=... would copy the whole group at every site
+    cells = []
+    for i in range(xs.size):
+        cells.extend(cellfun(xs[i],ys[i],ps[:,i].tolist()).group)
+    phc.group = cells
         
     phc.translate(x0,y0)
     return phc
@@ -457,7 +512,8 @@ def make_phc_inpoly(crystal: "Crystal", poly: "sm.Poly", scaling: float, cellpar
     cellfun : TYPE, optional
         A function of the type fun(x,y,params) that returns the geometry of the unit cell.
         It should also return the number of parameters required to draw the unit cell if "test" is passed as params. 
-        The default is __circ_cellfun__.
+        The default is __circ_cellfun__. For large crystals consider __circref_cellfun__, which
+        places references to a single circle cell instead of one circle per site.
     name : str, optional
         Name of the crystal. The default is "".
 
@@ -469,14 +525,16 @@ def make_phc_inpoly(crystal: "Crystal", poly: "sm.Poly", scaling: float, cellpar
     """
     nargs = cellfun(0,0,"test");
     phc = GeomGroup();
-    for i in range(len(crystal.xpts)):
-        xpos = crystal.xpts[i]*scaling
-        ypos = crystal.ypts[i]*scaling
-        if(poly.point_inside(xpos,ypos)):
-            params = [0.]*nargs
-            for j in range(nargs):
-                params[j] = crystal.params[j,i]*cellparams[j]
-            phc+=cellfun(xpos,ypos,params)   
+    xs,ys,ps = _scaled_sites(crystal,scaling,cellparams,nargs)
+    inside = poly.points_inside(xs,ys)
+    if(cellfun is __circ_cellfun__):
+        return _circles_at_sites(xs[inside],ys[inside],ps[0,inside],x0,y0)
+    if(cellfun is __circref_cellfun__):
+        return _circrefs_at_sites(xs[inside],ys[inside],ps[0,inside],x0,y0)
+    cells = []
+    for i in np.nonzero(inside)[0]:
+        cells.extend(cellfun(xs[i],ys[i],ps[:,i].tolist()).group)
+    phc.group = cells
         
     phc.translate(x0,y0)
     return phc
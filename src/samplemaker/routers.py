@@ -8,8 +8,6 @@ Automatic port-to-port routing functions.
 import math
 import numpy as np
 from samplemaker.devices import DevicePort
-import samplemaker.makers as sm
-from copy import deepcopy
 
 # The following are routines for the connector
 def __connectable_facing(port1: "DevicePort",port2: "DevicePort",
@@ -41,14 +39,13 @@ def __connectable_facing(port1: "DevicePort",port2: "DevicePort",
     # Get the vector from port 1 to port 2
     dx = port2.x0-port1.x0
     dy = port2.y0-port1.y0
-    if(port1.dx()!=0):
+    p1dx = port1.dx()
+    if(p1dx!=0):
         # Case1: port 1 is horizontal
         if(abs(dy)<2*rad):
             # the y offset is small enough to use a C bend
-            dxsign = 1
-            if(abs(dx)!=0): # Note: sometimes this can be zero
-                dxsign = dx/abs(dx)
-            if(port1.dx()+port2.dx()==0 and dxsign==port1.dx()):
+            dxsign = 1 if dx>=0 else -1 # Note: dx can be zero, counts as positive
+            if(p1dx+port2.dx()==0 and dxsign==p1dx):
                 # facing each other checks
                 if(abs(dy)<1e-3):
                     # will use straight line
@@ -57,17 +54,16 @@ def __connectable_facing(port1: "DevicePort",port2: "DevicePort",
                     # will create a C bend
                     slen = (abs(dx)-2*rad)/2
                     if(slen<0):
-                        return True,[["C",port1.dx()*dy,abs(dx)/2]]
+                        return True,[["C",p1dx*dy,abs(dx)/2]]
                     else:
-                        return True,[["S",slen],["C",port1.dx()*dy,rad],["S",slen]]
+                        return True,[["S",slen],["C",p1dx*dy,rad],["S",slen]]
         return False, []
     else: #Case2 : port 1 is vertical
+        p1dy = port1.dy()
         if(abs(dx)<2*rad):
             # the y offset is small enough to use a C bend
-            dysign = 1
-            if(abs(dy)!=0):
-                dysign = dy/abs(dy)
-            if(port1.dy()+port2.dy()==0 and dysign==port1.dy()):
+            dysign = 1 if dy>=0 else -1
+            if(p1dy+port2.dy()==0 and dysign==p1dy):
                 # facing each other checks
                 if(abs(dx)<1e-3):
                     # will use straight line
@@ -76,9 +72,9 @@ def __connectable_facing(port1: "DevicePort",port2: "DevicePort",
                     # will create a C bend
                     slen = (abs(dy)-2*rad)/2
                     if(slen<0):
-                        return True,[["C",-port1.dy()*dx,abs(dy)/2]]
+                        return True,[["C",-p1dy*dx,abs(dy)/2]]
                     else:
-                        return True,[["S",slen],["C",-port1.dy()*dx,rad],["S",slen]]
+                        return True,[["S",slen],["C",-p1dy*dx,rad],["S",slen]]
         return False, []
 
 def __connectable_bend(port1: "DevicePort",port2: "DevicePort",
@@ -118,13 +114,13 @@ def __connectable_bend(port1: "DevicePort",port2: "DevicePort",
     t = (-(dx)*dy2+dy*dx2)/det
     s = (-(dx)*dy1+dy*dx1)/det
     if(t>0 and s>0):
-        xstp = (t-rad)*port1.dx()
-        ystp = (t-rad)*port1.dy()
+        xstp = (t-rad)*dx1
+        ystp = (t-rad)*dy1
         s1 = math.sqrt(xstp*xstp+ystp*ystp)
         #xstp = (s-rad)*port2.dx()
         #ystp = (s-rad)*port2.dy()
         #s2 = math.sqrt(xstp*xstp+ystp*ystp)
-        p1 = deepcopy(port1)
+        p1 = port1.clone()
         p1.S(s1)
         if(det>0): 
             p1.BL(rad)
@@ -162,25 +158,30 @@ def __connect_step(port1: "DevicePort",port2: "DevicePort",
     """
     
     seq = []
-    if(port1.dx() !=0):
-        if(abs(port2.y0-port1.y0)<2*rad): # It's better to bend if too close
+    p1dx = port1.dx()
+    p2dx = port2.dx()
+    dx = port2.x0-port1.x0
+    dy = port2.y0-port1.y0
+    if(p1dx !=0):
+        if(abs(dy)<2*rad): # It's better to bend if too close
             SLen=-1
         else:
-            SLen = port1.dx()*(port2.x0+port2.dx()*rad-port1.x0)-rad
+            SLen = p1dx*(port2.x0+p2dx*rad-port1.x0)-rad
         #print("slen in x",SLen)
-        if(port2.dx()==0):
-            if(abs(port2.x0-port1.x0)<4*rad):
+        if(p2dx==0):
+            if(abs(dx)<4*rad):
                 SLen+=2*rad
             else:
                 SLen-=2*rad    
     else:
-        if(abs(port2.x0-port1.x0)<2*rad): # It's better to bend if too close
+        p2dy = port2.dy()
+        if(abs(dx)<2*rad): # It's better to bend if too close
             SLen=-1
         else:
-            SLen = port1.dy()*(port2.y0+port2.dy()*rad-port1.y0)-rad
+            SLen = port1.dy()*(port2.y0+p2dy*rad-port1.y0)-rad
         #print("slen in y",SLen)
-        if(port2.dy()==0):
-            if(abs(port2.y0-port1.y0)<4*rad):
+        if(p2dy==0):
+            if(abs(dy)<4*rad):
                 SLen+=2*rad
             else:
                 SLen-=2*rad    
@@ -190,7 +191,7 @@ def __connect_step(port1: "DevicePort",port2: "DevicePort",
         port1.S(SLen)    
         seq = [["S",SLen]]
     # Now see if we get closer by going left or right
-    p1 = deepcopy(port1)
+    p1 = port1.clone()
     p1.fix()
     p1.BL(rad)
     dL = p1.dist(port2)
@@ -263,7 +264,7 @@ def WaveguideConnect(port1: "DevicePort",port2: "DevicePort",
         #print("connectable")
         return True,res[1]
     else:
-        p1 = deepcopy(port1)
+        p1 = port1.clone()
         seq = []
         for i in range(4):
             res = __connect_step(p1, port2,rad)
@@ -301,40 +302,47 @@ def ElbowRouter(port1: "DevicePort",port2: "DevicePort", offset: float = 5):
     x0 = port1.x0;
     y0 = port1.y0;
     r0 = port1.angle();
+    cost = math.cos(r0)
+    sint = math.sin(r0)
     # Rotate all in the reference of port1
-    p2dot = sm.make_dot(port2.x0, port2.y0)
-    p2dot.rotate(x0, y0, -math.degrees(r0))
-    x1 = p2dot.x-x0;
-    y1 = p2dot.y-y0;
+    dx = port2.x0-x0
+    dy = port2.y0-y0
+    x1 = cost*dx+sint*dy
+    y1 = -sint*dx+cost*dy
     if(abs(y1) < 0.005):
         xpts = [0,x1];
         ypts = [0,y1];
     else:
-        aout = port2.angle()-r0%(2*math.pi);
+        aout = (port2.angle()-r0)%(2*math.pi);
+        cosa = math.cos(aout)
+        sina = math.sin(aout)
         # offset
         xs = offset;
         xs1 = xs+3*offset;
-        xe = x1+offset*math.cos(aout);
-        ye = y1+offset*math.sin(aout);
-        xe1 = xe+3*offset*math.cos(aout);
-        ye1 = ye+3*offset*math.sin(aout);
+        xe = x1+offset*cosa;
+        ye = y1+offset*sina;
+        xe1 = xe+3*offset*cosa;
+        ye1 = ye+3*offset*sina;
     
+        # cubic Bezier in Bernstein form, start and end points added around it
         t = np.array([0,0.25,0.5,0.75,1]);
-        xpts = np.power(1-t,3)*xs+3*np.power(1-t,2)*t*xs1+3*(1-t)*np.power(t,2)*xe1+np.power(t,3)*xe
-        ypts = 3*(1-t)*np.power(t,2)*ye1+np.power(t,3)*ye;
-        xpts = np.append([0],xpts);
-        xpts = np.append(xpts,[x1])
-        ypts = np.append([0],ypts);
-        ypts = np.append(ypts,[y1])
-        xpts = xpts.tolist()
-        ypts = ypts.tolist()
+        omt = 1-t
+        b0 = omt*omt*omt
+        b1 = 3*omt*omt*t
+        b2 = 3*omt*t*t
+        b3 = t*t*t
+        xpts = np.empty(7)
+        ypts = np.empty(7)
+        xpts[0] = 0
+        ypts[0] = 0
+        xpts[1:6] = b0*xs+b1*xs1+b2*xe1+b3*xe
+        ypts[1:6] = b2*ye1+b3*ye
+        xpts[6] = x1
+        ypts[6] = y1
 
-    cost = math.cos(r0)
-    sint = math.sin(r0)
-    for i in range(len(xpts)):
-        x=xpts[i]
-        y=ypts[i]
-        xpts[i]=cost*(x)-sint*(y)+x0
-        ypts[i]=sint*(x)+cost*(y)+y0
+    xa = np.asarray(xpts,dtype=np.float64)
+    ya = np.asarray(ypts,dtype=np.float64)
+    xpts = (cost*xa-sint*ya+x0).tolist()
+    ypts = (sint*xa+cost*ya+y0).tolist()
     
     return xpts,ypts
\ No newline at end of file
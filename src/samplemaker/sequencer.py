@@ -57,6 +57,7 @@ with `samplemaker`.
 import samplemaker.makers as sm
 from samplemaker.shapes import GeomGroup
 from samplemaker.devices import _DeviceList
+from samplemaker._kernels import _advance_state
 import math
 import numpy as np
 from copy import deepcopy
@@ -71,7 +72,7 @@ def __centerState(args,state,options):
     return GeomGroup()
 
 def __storeState(args,state,options):
-    state['STORED']+=[[state["x"],state["y"]]] 
+    state['STORED'].append([state["x"],state["y"]])
     return GeomGroup()
 
 def __initState(state,options):
@@ -85,6 +86,26 @@ def __initState(state,options):
         state["STORED"]=[]
         
 
+_SCALAR_TYPES = (bool, int, float, complex, str, type(None))
+
+def __snapshot_value(v):
+    # Scalars are shared, dictionaries are copied per entry and any other
+    # value (lists, arrays, ...) is deep copied
+    if(isinstance(v,_SCALAR_TYPES)):
+        return v
+    if(isinstance(v,dict)):
+        return {k: __snapshot_value(vv) for k,vv in v.items()}
+    return deepcopy(v)
+
+def __snapshot_state(state):
+    # Copy of the state for a nested sequencer, copied like the options
+    return {k: __snapshot_value(v) for k,v in state.items()}
+
+def __snapshot_options(options):
+    # Copy of the options for a nested sequencer, equivalent to deepcopy but
+    # skips the scalar device parameters
+    return {k: __snapshot_value(v) for k,v in options.items()}
+
 def __insertDevice(args,state,options):
     devname = args[0]
     inport = args[1]
@@ -93,26 +114,23 @@ def __insertDevice(args,state,options):
         dev = _DeviceList[devname].build()
         # pass the local parameters now
         dev._p = options["dev_"+devname]
-        if(hasattr(dev,"_seq")):
-            dev._seq.state = deepcopy(state)
-            dev._seq.options = deepcopy(options)
+        devseq = getattr(dev,"_seq",None)
+        if(devseq is not None):
+            devseq.state = __snapshot_state(state)
+            devseq.options = __snapshot_options(options)
         g = dev.run()
-        if(inport in dev._ports and outport in dev._ports):
-            p1 = dev._ports[inport]
-            xd = p1.x0
-            yd = p1.y0
-            ad = math.degrees(p1.angle())+180
-            p2 = dev._ports[outport]
-            xdo = p2.x0
-            ydo = p2.y0
-            ado = math.degrees(p2.angle())
-            g.rotate(xd,yd,-ad+state["a"])
-            g.translate(state['x']-xd,state['y']-yd)
-            state['x']+=(xdo-xd)*math.cos(math.radians(state["a"]-ad))\
-                - (ydo-yd)*math.sin(math.radians(state["a"]-ad))
-            state['y']+=(xdo-xd)*math.sin(math.radians(state["a"]-ad))\
-                    + (ydo-yd)*math.cos(math.radians(state["a"]-ad))
-            state['a']+=ado
+        p1 = dev._ports.get(inport)
+        p2 = dev._ports.get(outport)
+        if(p1 is not None and p2 is not None):
+            xd,yd,ad = p1.x0,p1.y0,math.degrees(p1.angle())+180
+            xdo,ydo,ado = p2.x0,p2.y0,math.degrees(p2.angle())
+            x,y,a = state['x'],state['y'],state['a']
+            g.rotate(xd,yd,-ad+a)
+            g.translate(x-xd,y-yd)
+            # float arguments keep a single compiled signature when numba is available
+            state['x'],state['y'] = _advance_state(float(x),float(y),float(a),
+                                                   float(xd),float(yd),float(xdo),float(ydo),float(ad))
+            state['a']=a+ado
         else:
             print("Warning: device has no port called", inport, "or", outport)
         return g
@@ -144,6 +162,8 @@ def default_command_list():
     defcmdlist["DEV"] = (3,__insertDevice)
     return defcmdlist
 
+_default_options_cache = None
+
 def default_options():
     """
     Default options for the sequencer.
@@ -155,14 +175,20 @@ def default_options():
         Returns the default options for the sequencer.
 
     """
-    defopts = dict()
-    for dname in _DeviceList:
-        dev = _DeviceList[dname]()
-        dev.parameters()
-        defopts["dev_"+dname] = dev._p
-        
-    defopts["__no_init__"] = False # Disable INIT command 
-    return defopts        
+    global _default_options_cache
+    # the cache is rebuilt whenever devices are registered or replaced
+    key = tuple(_DeviceList.items())
+    if(_default_options_cache is None or _default_options_cache[0]!=key):
+        defopts = dict()
+        for dname in _DeviceList:
+            dev = _DeviceList[dname]()
+            dev.parameters()
+            defopts["dev_"+dname] = dev._p
+            
+        defopts["__no_init__"] = False # Disable INIT command 
+        _default_options_cache = (key,defopts)
+    # callers may modify the returned options, never hand out the cached values
+    return deepcopy(_default_options_cache[1])
 
 class SequencerState:
     def __init__(self):
@@ -223,6 +249,8 @@ class Sequencer:
         self.dic = seq_dictionary
         self.state = seq_state.state
         self.debug_state = False
+        self._prog = []
+        self._prog_err = None
     
     def set_debug_state(self,value: bool):
         """
@@ -266,18 +294,20 @@ class Sequencer:
         self.state["y"]=0
         self.state["a"]=0
     
-    def run(self):
+    def compile(self):
         """
-        Execute the sequence and get the final geometry object.
+        Translates the sequence into a list of (function, arguments) pairs
+        using the command dictionary. The sequence is checked for unknown 
+        commands and wrong number of arguments, only the instructions before
+        the first error are kept. Called by run() before execution.
 
         Returns
         -------
-        g : samplemaker.shapes.GeomGroup
-            The resulting geometry.
+        None.
 
         """
-        g = GeomGroup();
-        self.dic["INIT"][1](self.state,self.options)
+        prog = []
+        err = None
         for instr in self.seq:
             if(len(instr)==0): continue
             cmd = instr[0]
@@ -285,21 +315,51 @@ class Sequencer:
             if cmd in self.dic:
                 action = self.dic[cmd]
                 if(action[0]!=len(args)):
-                    print("Wrong number of arguments for command ",cmd)
+                    err = ("Wrong number of arguments for command ",cmd)
                     break
-                else:
-                    g += action[1](args,self.state,self.options)
-                    if self.debug_state:
-                        print('self state ',self.state)
+                prog.append((action[1],args))
             else:
-                print("Command ", cmd, " does not exist")
+                err = ("Command ", cmd, " does not exist")
                 break
-        g.translate(self.state["__XC__"],self.state["__YC__"])
-        self.state["x"]+=self.state["__XC__"]
-        self.state["y"]+=self.state["__YC__"]
-        for coords in self.state["STORED"]:
-            coords[0]+=self.state["__XC__"]
-            coords[1]+=self.state["__YC__"]
+        self._prog = prog
+        self._prog_err = err
+        
+    def run(self):
+        """
+        Execute the sequence and get the final geometry object.
+
+        Returns
+        -------
+        g : samplemaker.shapes.GeomGroup
+            The resulting geometry.
+
+        """
+        self.compile()
+        self.dic["INIT"][1](self.state,self.options)
+        state = self.state
+        options = self.options
+        if self.debug_state:
+            parts = []
+            for fn,args in self._prog:
+                parts.append(fn(args,state,options))
+                print('self state ',state)
+        else:
+            parts = [fn(args,state,options) for fn,args in self._prog]
+        g = GeomGroup.concat(parts)
+        if(self._prog_err is not None):
+            print(*self._prog_err)
+        xc = self.state["__XC__"]
+        yc = self.state["__YC__"]
+        self.state["x"]+=xc
+        self.state["y"]+=yc
+        # without a CENTER command there is nothing to shift
+        if(xc!=0 or yc!=0):
+            g.translate(xc,yc)
+            stored = self.state["STORED"]
+            if(len(stored)>0):
+                arr = np.asarray(stored,dtype=np.float64)
+                arr += (xc,yc)
+                stored[:] = arr.tolist()
         if self.debug_state:
             print('final state ',self.state)
             
@@ -60,6 +60,7 @@ to save memory and computation time. For example
     geomA += geom2 # Shallow copy of geom2 into geomA. Any change to geom2 will affect geomA
     geomB += geom2.copy() # Deep copy, any change to geom2 will not affect geomB
 
+The `+=` operator extends geomA in place, while `geomA + geom2` creates a new group.
 
 """
 
@@ -69,10 +70,68 @@ import math
 from pkg_resources import resource_filename
 import samplemaker.resources.boopy as boopy
 from typing import List
+from functools import lru_cache
 from samplemaker import _BoundingBoxPool
+from samplemaker._kernels import HAS_NUMBA, _rotate_points, _point_in_poly, _tapered_path_core
 
 _glyphs = dict()
 
+# Offset (in half widths/heights) of a box center from its numerical-keypad reference point,
+# indexed by numkey (1 = lower-left, 5 = center, 9 = upper-right). Index 0 is unused.
+_NUMKEY_XOFF = (0, 1,0,-1, 1,0,-1, 1,0,-1)
+_NUMKEY_YOFF = (0, 1,1,1, 0,0,0, -1,-1,-1)
+
+# Exact cosine and sine of multiples of 90 degrees, indexed by quadrant
+_QUADRANT_COS = (1.0, 0.0, -1.0, 0.0)
+_QUADRANT_SIN = (0.0, 1.0, 0.0, -1.0)
+
+@lru_cache(maxsize=4096)
+def _rotation(rot):
+    # Cosine and sine of a rotation angle in degrees. Layouts reuse a handful
+    # of angles, so the values are cached, axis-aligned angles are exact.
+    if(rot%90==0):
+        q = int(rot//90)%4
+        return _QUADRANT_COS[q], _QUADRANT_SIN[q]
+    return math.cos(rot/180*math.pi), math.sin(rot/180*math.pi)
+
+@lru_cache(maxsize=4096)
+def _glyph_polygons(c, height, width):
+    # Polygon data of a single glyph at the origin, computed once per glyph and size.
+    # The arrays are shared between calls and must be copied before use.
+    letter = deepcopy(_glyphs[c][0])
+    letter.scale(0, 0, height, height)
+    for p in letter.group:
+        p.width=width
+    letter.path_to_poly()
+    return tuple(p.data for p in letter.group)
+
+class _Shape:
+    # Common copy behaviour of all shape classes
+    def clone(self):
+        """
+        Creates a detached copy of the shape. Numeric arrays and coordinate lists
+        are copied, cell references keep pointing to the same cell geometry.
+
+        Returns
+        -------
+        Shape
+            A copy of the shape.
+
+        """
+        cls = self.__class__
+        obj = cls.__new__(cls)
+        d = obj.__dict__
+        for k,v in self.__dict__.items():
+            if(type(v)==np.ndarray): 
+                v = v.copy()
+            elif(type(v)==list):
+                v = list(v)
+            d[k] = v
+        return obj
+    
+    def __deepcopy__(self, memo):
+        return self.clone()
+
 class GeomGroup:
     def __init__(self):
         """
@@ -104,6 +163,47 @@ class GeomGroup:
         gg.group = self.group + other.group
         return gg
     
+    def __iadd__(self,other : 'GeomGroup') -> 'GeomGroup':
+        """
+        Appends the elements of another geometry in place. Other references
+        to this group (or to its element list) will see the new elements.
+
+        Parameters
+        ----------
+        other : 'GeomGroup'
+            The GeomGroup you want to add.
+
+        Returns
+        -------
+        Reference to the the object.
+
+        """
+        self.group.extend(other.group)
+        return self
+    
+    @classmethod
+    def concat(cls, groups) -> 'GeomGroup':
+        """
+        Combines many geometries at once. Equivalent to summing all groups
+        but the element list is built in a single pass.
+
+        Parameters
+        ----------
+        groups : iterable of 'GeomGroup'
+            The GeomGroups to be combined, in order.
+
+        Returns
+        -------
+        gg : 'GeomGroup'
+            The resulting GeomGroup.
+
+        """
+        gg = cls()
+        elements = gg.group
+        for g in groups:
+            elements.extend(g.group)
+        return gg
+    
     def add(self,geom):
         """
         Adds a shape to the group (deprecated)
@@ -122,7 +222,8 @@ class GeomGroup:
         
     def copy(self) -> "GeomGroup":
         """
-        Makes a deep copy of the object.
+        Makes a deep copy of the object. Cell references in the copy still
+        point to the same cell geometry.
 
         Returns
         -------
@@ -130,7 +231,21 @@ class GeomGroup:
             A detached copy of self.
 
         """
-        return deepcopy(self)
+        g = GeomGroup()
+        g.group = [geom.clone() for geom in self.group]
+        return g
+    
+    def reset(self):
+        """
+        Removes all elements from the group, so that the object can be reused.
+        The list is cleared in place, other references to it will see an empty group.
+
+        Returns
+        -------
+        None.
+
+        """
+        self.group.clear()
     
     def flatten(self, layer_list: List[int] = []) -> "GeomGroup":
         """
@@ -149,27 +264,26 @@ class GeomGroup:
             A detached copy of the flattened geometry.
 
         """
+        return self.__flatten(layer_list, dict())
+    
+    def __flatten(self, layer_list, flat_cells):
+        # flat_cells maps the id of each referenced cell group to its flattened geometry
+        # before placement, so that cells referenced many times are only flattened once
         g = GeomGroup()
-        if len(layer_list) == 0:
-            for geom in self.group:            
-                if(type(geom)==SRef or type(geom)==ARef):
-                    flatg=geom.group.flatten()
-                    flatg=geom.place_group(flatg)
-                    g+=flatg
-                else:
-                    g.add(deepcopy(geom))
-        else:
-            for geom in self.group:            
-                if(type(geom)==SRef or type(geom)==ARef):
-                    flatg=geom.group.flatten(layer_list)
-                    flatg=geom.place_group(flatg)
-                    g+=flatg
-                else:
-                    if(geom.layer in layer_list):
-                        g.add(deepcopy(geom))
+        elements = g.group
+        for geom in self.group:
+            if(type(geom) in _REF_TYPES):
+                key = id(geom.group)
+                if(key not in flat_cells):
+                    flat_cells[key] = geom.group.__flatten(layer_list, flat_cells)
+                flatg=geom.place_group(flat_cells[key].copy())
+                elements.extend(flatg.group)
+            else:
+                if(len(layer_list) == 0 or geom.layer in layer_list):
+                    elements.append(geom.clone())
         return g
     
-    def get_sref_list(self, sref_list=set()):
+    def get_sref_list(self, sref_list=None):
         """
         Returns a unique list of strings with the 
         structures referenced by the object (recursively).
@@ -177,7 +291,7 @@ class GeomGroup:
         Parameters
         ----------
         sref_list : set, optional
-            A set of strings with cell names. The default is an empty set.
+            A set of strings with cell names, extended in place. The default is None (new set).
 
         Returns
         -------
@@ -185,13 +299,22 @@ class GeomGroup:
             The complete reference list.
 
         """
-        for geom in self.group:
-            if(type(geom)==SRef or type(geom)==ARef):
-                sref_list.add(geom.cellname)
-                sref_list=geom.group.get_sref_list(sref_list)
+        if(sref_list is None):
+            sref_list = set()
+        # Depth-first walk, cells referenced more than once are visited only once
+        visited = set()
+        stack = [self]
+        while stack:
+            gg = stack.pop()
+            for geom in gg.group:
+                if(type(geom) in _REF_TYPES):
+                    sref_list.add(geom.cellname)
+                    if(id(geom.group) not in visited):
+                        visited.add(id(geom.group))
+                        stack.append(geom.group)
         return sref_list                
         
-    def get_layer_list(self, layer_list=set()) -> set:
+    def get_layer_list(self, layer_list=None) -> set:
         """
         Returns a unique set of int with the layers in the object (recursively)
         Should be called by the user without arguments, when querying the layers
@@ -199,7 +322,7 @@ class GeomGroup:
         Parameters
         ----------
         layer_list : set, optional
-            A set of integers with layers. The default is empty set.
+            A set of integers with layers, extended in place. The default is None (new set).
 
         Returns
         -------
@@ -207,12 +330,19 @@ class GeomGroup:
             The complete layer list.
 
         """
-        for geom in self.group:
-            if(type(geom)==SRef or type(geom)==ARef):
-                layer_list=geom.group.get_layer_list(layer_list)
-            else:
-                layer_list.add(geom.layer)
-        
+        if(layer_list is None):
+            layer_list = set()
+        visited = set()
+        stack = [self]
+        while stack:
+            gg = stack.pop()
+            for geom in gg.group:
+                if(type(geom) in _REF_TYPES):
+                    if(id(geom.group) not in visited):
+                        visited.add(id(geom.group))
+                        stack.append(geom.group)
+                else:
+                    layer_list.add(geom.layer)
         return layer_list                
     
     def translate(self,dx: float,dy: float):
@@ -358,7 +488,7 @@ class GeomGroup:
             cnt["NARef"] = len([g for g in self.group if type(g)==ARef])
         else:
             for g in self.group:
-                if type(g)==SRef or type(g)==ARef:
+                if type(g) in _REF_TYPES:
                     subcnt = g.group.__entity_count(recursive,layer_wise,layer)
                     if type(g)==ARef:
                         for e in subcnt.keys(): 
@@ -419,12 +549,25 @@ class GeomGroup:
             The box representing the bounding box of the geometry.
 
         """
-        if len(self.group)!=0:
-            bb = self.group[0].bounding_box()
-            
+        # All polygon points are reduced at once, other elements are combined one by one
+        if(len(self.group)==0):
+            return None
+        llx = lly = math.inf
+        urx = ury = -math.inf
+        pdata = [geom.data for geom in self.group if type(geom)==Poly]
+        if(len(pdata)!=0):
+            xy = np.concatenate(pdata).reshape(-1,2)
+            llx, lly = xy.min(axis=0)
+            urx, ury = xy.max(axis=0)
         for geom in self.group:
-            bb.combine(geom.bounding_box())
-        return bb
+            if(type(geom)==Poly):
+                continue
+            bb = geom.bounding_box()
+            if(bb.llx<llx): llx = bb.llx
+            if(bb.lly<lly): lly = bb.lly
+            if(bb.llx+bb.width>urx): urx = bb.llx+bb.width
+            if(bb.lly+bb.height>ury): ury = bb.lly+bb.height
+        return Box(llx,lly,urx-llx,ury-lly)
     
     def to_boxes(self, layer: int) -> 'GeomGroup':
         """
@@ -486,9 +629,7 @@ class GeomGroup:
 
         """
         g = GeomGroup()
-        for geom in self.group:
-            if(geom.layer==layer):
-                g.add(geom)
+        g.group = [geom for geom in self.group if geom.layer==layer]
         return g
     
     def select_layers(self,layers: List[int]) -> 'GeomGroup':
@@ -507,9 +648,7 @@ class GeomGroup:
 
         """
         g = GeomGroup()
-        for geom in self.group:
-            if(geom.layer in layers):
-                g.add(geom)
+        g.group = [geom for geom in self.group if geom.layer in layers]
         return g
     
     def deselect_layers(self, layers: List[int])-> 'GeomGroup':
@@ -528,9 +667,7 @@ class GeomGroup:
 
         """
         g = GeomGroup()
-        for geom in self.group:
-            if(geom.layer not in layers):
-                g.add(geom)
+        g.group = [geom for geom in self.group if geom.layer not in layers]
         return g
         
     def select(self, query_str: str)-> 'GeomGroup':
@@ -689,7 +826,7 @@ class GeomGroup:
         """
         area = 0
         for i in range(len(self.group)):
-            if(type(self.group[i])==SRef or type(self.group[i])==ARef):
+            if(type(self.group[i]) in _REF_TYPES):
                 area+=self.group[i].group.get_area(); 
             else:
                 area+=self.group[i].area()
@@ -704,13 +841,15 @@ class GeomGroup:
         None.
 
         """
-        paths = GeomGroup()
-        for i in range(len(self.group)):
-            if(type(self.group[i])==Path):
-                paths+=self.group[i].to_polygon()
-        
-        self.group[:] = [g for g in self.group if not type(g)==Path]
-        self.group = self.group+paths.group
+        keep = []
+        polys = []
+        for g in self.group:
+            if(type(g)==Path):
+                polys.extend(g.to_polygon().group)
+            else:
+                keep.append(g)
+        keep.extend(polys)
+        self.group[:] = keep
         
     def text_to_poly(self):
         """
@@ -721,13 +860,15 @@ class GeomGroup:
         None.
 
         """
-        polys = GeomGroup();
-        for i in range(len(self.group)):
-            if(type(self.group[i])==Text): 
-                polys+=self.group[i].to_polygon()                
-
-        self.group[:] = [g for g in self.group if not type(g)==Text]
-        self.group = self.group+polys.group
+        keep = []
+        polys = []
+        for g in self.group:
+            if(type(g)==Text):
+                polys.extend(g.to_polygon().group)
+            else:
+                keep.append(g)
+        keep.extend(polys)
+        self.group[:] = keep
 
     def all_to_poly(self, Npts_circ: int=12, Npts_arc: int=32, split_arc: bool =False ):
         """
@@ -738,29 +879,23 @@ class GeomGroup:
         None.
 
         """
-        
-        polys = GeomGroup();
-        for i in range(len(self.group)):
-            g = self.group[i]
-            if(type(g)==Poly):
-                polys+=self.group[i].to_polygon()
-            if(type(g)==Text):
-                polys+=self.group[i].to_polygon()
-            if(type(g)==Path):
-                polys+=self.group[i].to_polygon()                
-            if(type(g)==Circle):
-                polys+=self.group[i].to_polygon(Npts_circ)
-            if(type(g)==Ellipse):
-                polys+=self.group[i].to_polygon(Npts_arc)
-            if(type(g)==Ring):
-                polys+=self.group[i].to_polygon(Npts_arc)
-            if(type(g)==Arc):
-                polys+=self.group[i].to_polygon(Npts_arc,split_arc)
-                    
-                    
-
-        self.group[:] = [g for g in self.group if type(g)==SRef or type(g)==ARef]
-        self.group = self.group+polys.group    
+        # References are kept in front, other shapes not listed here are dropped
+        refs = []
+        polys = []
+        for g in self.group:
+            t = type(g)
+            if(t in _REF_TYPES):
+                refs.append(g)
+            elif(t==Poly or t==Text or t==Path):
+                polys.extend(g.to_polygon().group)
+            elif(t==Circle):
+                polys.extend(g.to_polygon(Npts_circ).group)
+            elif(t==Ellipse or t==Ring):
+                polys.extend(g.to_polygon(Npts_arc).group)
+            elif(t==Arc):
+                polys.extend(g.to_polygon(Npts_arc,split_arc).group)
+        refs.extend(polys)
+        self.group[:] = refs
     
     def poly_to_circle(self, thresh: float = 0.95, vcount: int = 10, include_refs: bool = True):
         """
@@ -791,14 +926,14 @@ class GeomGroup:
                 else:
                     polys+=convp
                 continue
-            if (type(self.group[i])==SRef or type(self.group[i])==ARef):                
+            if (type(self.group[i]) in _REF_TYPES):                
                 if(include_refs):
                     self.group[i].group.poly_to_circle(thresh,vcount)
                 continue
             # None of the above, just keep
             polys.group+=[self.group[i]]
         
-        self.group[:] = [g for g in self.group if type(g)==SRef or type(g)==ARef]
+        self.group[:] = [g for g in self.group if type(g) in _REF_TYPES]
         self.group = self.group+polys.group    
     
     def in_polygons(self, x: float,y:float) -> bool:
@@ -818,9 +953,9 @@ class GeomGroup:
             True if coorinate is inside the polygon.
 
         """
-        for i in range(len(self.group)):
-            if(type(self.group[i])==Poly):
-                if(self.group[i].point_inside(x,y)):
+        for geom in self.group:
+            if(type(geom)==Poly):
+                if(geom.point_inside(x,y)):
                     return True
         return False
     
@@ -833,28 +968,44 @@ class GeomGroup:
         Nothing
 
         """
-        self.group[:] =  [g for g in self.group if type(g)==SRef or type(g)==ARef]
+        self.group[:] =  [g for g in self.group if type(g) in _REF_TYPES]
         
                    
     
+    def __split_layer(self,layer: int):
+        # Separates the polygons in a layer from all other elements in a single pass
+        polys = []
+        rest = []
+        for g in self.group:
+            if(type(g)==Poly and g.layer==layer):
+                polys.append(g)
+            else:
+                rest.append(g)
+        return polys, rest
+    
     def __get_boopy__(self,layer: int):
+        return self.__to_boopy([g for g in self.group if type(g)==Poly and g.layer==layer])
+    
+    def __to_boopy(self,polys):
         pg0 = boopy.PolyGroup()
-        for i in range(len(self.group)):
-            if(type(self.group[i])==Poly and self.group[i].layer==layer):
-                pdata = self.group[i].int_data()
-                pg0.addPolyData(pdata)
+        if(len(polys)==0):
+            return pg0
+        # The integer coordinates are cached on each polygon, see Poly.int_data()
+        for p in polys:
+            pg0.addPolyData(p.int_data())
         return pg0
     
     def __set_boopy__(self, pg0,layer: int):
         npoly = pg0.getPolyCount()
-        polys = GeomGroup();
+        polys = []
         for i in range(npoly):
-            poly = Poly([],[],layer)
-            pdata = np.array(pg0.getPoly(i))
-            pdata =pdata/1000.0
+            poly = Poly.__new__(Poly)
+            poly.layer = layer
+            pdata = np.array(pg0.getPoly(i),dtype=np.float64)
+            pdata /= 1000.0
             poly.set_data(pdata)
-            polys.add(poly)
-        self.group = self.group + polys.group
+            polys.append(poly)
+        self.group.extend(polys)
     
     def boolean_union(self,layer: int):
         """
@@ -873,14 +1024,51 @@ class GeomGroup:
 
         """
         # Get the boost python data
-        pg0 = self.__get_boopy__(layer)
+        polys, rest = self.__split_layer(layer)
+        pg0 = self.__to_boopy(polys)
         # Remove the old polygons
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layer)]
+        self.group[:] = rest
         pg0.assign()
         # Put back the boost python data 
         self.__set_boopy__(pg0, layer)
         return self
 
+    def boolean_union_all(self, layers: List[int] = None):
+        """
+        Performs a boolean union (OR) of the polygons in each layer separately.
+        Equivalent to calling boolean_union on every layer, but the group is
+        scanned only once.
+
+        Parameters
+        ----------
+        layers : List[int], optional
+            The layers in which the union should be performed. The default is None (all layers).
+
+        Returns
+        -------
+        Reference to the the object.
+
+        """
+        if(layers is not None):
+            layers = set(layers)
+        # Polygons of each layer, in order of first appearance
+        by_layer = dict()
+        rest = []
+        for g in self.group:
+            if(type(g)==Poly and (layers is None or g.layer in layers)):
+                if(g.layer in by_layer):
+                    by_layer[g.layer].append(g)
+                else:
+                    by_layer[g.layer] = [g]
+            else:
+                rest.append(g)
+        self.group[:] = rest
+        for layer, polys in by_layer.items():
+            pg0 = self.__to_boopy(polys)
+            pg0.assign()
+            self.__set_boopy__(pg0, layer)
+        return self
+
     def boolean_difference(self, targetB: "GeomGroup", layerA: int, layerB: int):
         """
         Performs a full difference between the polygons in the calling group matching layerA
@@ -903,12 +1091,13 @@ class GeomGroup:
 
         """
         # Get the boost python data
-        pgA = self.__get_boopy__(layerA)
+        polys, rest = self.__split_layer(layerA)
+        pgA = self.__to_boopy(polys)
         pgB = targetB.__get_boopy__(layerB)
         # Difference
         pgA.difference(pgB)
         # Remove the old polygons
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layerA)]
+        self.group[:] = rest
         # Put back the boost python data (merge is automatically done)
         self.__set_boopy__(pgA, layerA)
         return self
@@ -935,12 +1124,13 @@ class GeomGroup:
 
         """
         # Get the boost python data
-        pgA = self.__get_boopy__(layerA)
+        polys, rest = self.__split_layer(layerA)
+        pgA = self.__to_boopy(polys)
         pgB = targetB.__get_boopy__(layerB)
         # Difference
         pgA.exor(pgB)
         # Remove the old polygons
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layerA)]
+        self.group[:] = rest
         # Put back the boost python data (merge is automatically done)
         self.__set_boopy__(pgA, layerA)
         return self
@@ -967,12 +1157,13 @@ class GeomGroup:
 
         """
         # Get the boost python data
-        pgA = self.__get_boopy__(layerA)
+        polys, rest = self.__split_layer(layerA)
+        pgA = self.__to_boopy(polys)
         pgB = targetB.__get_boopy__(layerB)
         # Difference
         pgA.intersection(pgB)
         # Remove the old polygons
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layerA)]
+        self.group[:] = rest
         # Put back the boost python data (merge is automatically done)
         self.__set_boopy__(pgA, layerA)
         return self
@@ -998,9 +1189,10 @@ class GeomGroup:
         Reference to the the object.
 
         """
-        pg0 = self.__get_boopy__(layer)
+        polys, rest = self.__split_layer(layer)
+        pg0 = self.__to_boopy(polys)
         pg0.resize(round(offset*1000),corner_fill_arc, num_circle_segments)
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layer)]
+        self.group[:] = rest
         self.__set_boopy__(pg0, layer)
         return self
         
@@ -1053,14 +1245,15 @@ class GeomGroup:
         Reference to the the object.
 
         """
-        pg0 = self.__get_boopy__(layer)
-        pgorig = self.__get_boopy__(layer)
+        polys, rest = self.__split_layer(layer)
+        pg0 = self.__to_boopy(polys)
+        pgorig = self.__to_boopy(polys)
         if(distance != 0):
             pg0.resize(round((offset+distance)*1000),corner_fill_arc, num_circle_segments)
             pgorig.resize(round(distance*1000),corner_fill_arc,num_circle_segments)
         else:
             pg0.resize(round(offset*1000),corner_fill_arc, num_circle_segments)
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layer)]
+        self.group[:] = rest
         if(offset>0):
             pg0.difference(pgorig)
             self.__set_boopy__(pg0,layer)
@@ -1095,7 +1288,8 @@ class GeomGroup:
         reference to the inverted object.
 
         """
-        pg0 = self.__get_boopy__(layer)
+        polys, rest = self.__split_layer(layer)
+        pg0 = self.__to_boopy(polys)
         sel = self.select_layer(layer)
         if len(sel.group)==0: 
             return self
@@ -1105,7 +1299,7 @@ class GeomGroup:
             bb.poly_resize(offset, layer)
         pgm = bb.__get_boopy__(layer)
         pgm.difference(pg0)
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layer)]        
+        self.group[:] = rest
         self.__set_boopy__(pgm, layer)
         
         return self
@@ -1125,9 +1319,10 @@ class GeomGroup:
         Reference to the the object.
 
         """
-        pg0 = self.__get_boopy__(layer)
+        polys, rest = self.__split_layer(layer)
+        pg0 = self.__to_boopy(polys)
         pg0.trapezoids()
-        self.group[:] = [g for g in self.group if not (type(g)==Poly and g.layer==layer)]
+        self.group[:] = rest
         self.__set_boopy__(pg0, layer)
         return self
     
@@ -1174,7 +1369,7 @@ class GeomGroup:
                 ndisc+=g.three_point_filter(keep_str)
         return ndisc
 
-class Dot:
+class Dot(_Shape):
     def __init__(self,x,y):
         self.x=x
         self.y=y
@@ -1186,14 +1381,12 @@ class Dot:
     def rotate(self,x0,y0,rot):
         xc=self.x-x0
         yc=self.y-y0
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         self.x=cost*xc-sint*yc+x0
         self.y=sint*xc+cost*yc+y0
     
     def rotate_translate(self, x0, y0, rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         x=self.x
         y=self.y
         self.x = (cost*(x)-sint*(y)+x0)
@@ -1209,7 +1402,7 @@ class Dot:
     def mirrorY(self,y0):
         self.y = 2*y0-self.y
    
-class Box:
+class Box(_Shape):
     def __init__(self,llx: float, lly: float, width: float, height: float):
         '''
         Initialize a box object (not for drawing)
@@ -1300,16 +1493,18 @@ class Box:
         None.
 
         '''
-        tmp_urx = self.urx()
-        tmp_ury = self.ury()
+        tmp_urx = self.llx+self.width
+        tmp_ury = self.lly+self.height
+        other_urx = other.llx+other.width
+        other_ury = other.lly+other.height
         if other.llx < self.llx:
             self.llx = other.llx
         if other.lly < self.lly:
             self.lly = other.lly
-        if other.urx() > tmp_urx:
-            tmp_urx=other.urx()
-        if other.ury() > tmp_ury:
-            tmp_ury = other.ury()
+        if other_urx > tmp_urx:
+            tmp_urx = other_urx
+        if other_ury > tmp_ury:
+            tmp_ury = other_ury
             
         self.width = tmp_urx-self.llx
         self.height = tmp_ury-self.lly
@@ -1324,8 +1519,7 @@ class Box:
             The poly representing the box.
 
         """
-        return Poly([self.llx,self.urx(),self.urx(),self.llx],
-             [self.lly,self.lly,self.ury(),self.ury()],0)
+        return Poly.from_rect(self.llx,self.lly,self.width,self.height,0)
     
     def toRect(self) ->"GeomGroup":
         """
@@ -1359,75 +1553,152 @@ class Box:
 
         """
         if(numkey<1 or numkey>9): numkey=5
-        xoff = -((numkey-1)%3-1)
-        yoff = math.floor((9-numkey)/3)-1
+        xoff = _NUMKEY_XOFF[numkey]
+        yoff = _NUMKEY_YOFF[numkey]
         return (self.cx()-xoff*self.width/2,self.cy()-yoff*self.height/2)
         
     
 
-class Poly:
+class Poly(_Shape):
+    _bbox = None # cached bounding box, see bounding_box()
+    _idata = None # cached integer coordinates, see int_data()
+    
     def set_points(self,xpts,ypts):
         # Note: only for polygon class, we store the points in GDS format,
         # already scaled to nanometers and as X0,Y0,X1,Y1,X2,Y2...
         # rdata = np.round_((np.array([xpts,ypts])*1000)).astype(int)
-        rdata = np.array([xpts,ypts],dtype="float64")
-        self.data = np.transpose(rdata).reshape(-1)
-        self.data = np.append(self.data,self.data[0:2])
-        self.Npts = math.floor(self.data.size/2)
+        x = np.asarray(xpts,dtype="float64")
+        y = np.asarray(ypts,dtype="float64")
+        n = x.size
+        if(n==0):
+            self.data = np.empty(0)
+            self.Npts = 0
+            return
+        # interleave the points and close the polygon in a single buffer
+        data = np.empty(2*n+2)
+        data[0:2*n:2] = x
+        data[1:2*n:2] = y
+        data[2*n:] = data[0:2]
+        self.data = data
+        self.Npts = n+1
     
     def set_data(self, data):
         self.data = data
         self.Npts = math.floor(self.data.size/2)
+        self._bbox = self._idata = None
         
     def int_data(self):
-        return np.round_(self.data*1000).astype(int)
+        # Like the bounding box, the result is valid as long as data is the same
+        # array and has not been transformed in place. The returned array is the
+        # cache itself and is read-only.
+        cache = self._idata
+        if(cache is None or cache[0] is not self.data):
+            idata = np.rint(self.data*1000).astype(int)
+            idata.flags.writeable = False
+            cache = (self.data,idata)
+            self._idata = cache
+        return cache[1]
     
     def set_int_data(self, idata):
         self.data = idata.astype("float64")/1000;
         self.Npts = self.data.size/2
+        idata = idata.view()
+        idata.flags.writeable = False
+        self._idata = (self.data,idata)
     
     def __init__(self,xpts,ypts,layer):
         self.layer = layer
         self.set_points(xpts,ypts)
+    
+    @classmethod
+    def from_rect(cls,llx,lly,width,height,layer):
+        """
+        Creates a rectangular polygon directly from its lower-left corner and size.
+        Faster than passing the list of points.
+
+        Parameters
+        ----------
+        llx : float
+            lower-left x-coordinate.
+        lly : float
+            lower-left y-coordinate.
+        width : float
+            width of the rectangle.
+        height : float
+            height of the rectangle.
+        layer : int
+            the polygon layer.
+
+        Returns
+        -------
+        Poly
+            The rectangle polygon.
+
+        """
+        p = cls.__new__(cls)
+        p.layer = layer
+        urx = llx+width
+        ury = lly+height
+        p.data = np.array([llx,lly,urx,lly,urx,ury,llx,ury,llx,lly],dtype="float64")
+        p.Npts = 5
+        return p
         
     def translate(self,dx,dy):
-        self.data[0::2]+=dx
-        self.data[1::2]+=dy        
+        # reshaping the 1D point array gives a view, updated in place
+        xy = self.data.reshape(-1,2)
+        xy += (dx,dy)
+        self._bbox = self._idata = None
     
     def rotate_translate(self,x0,y0,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
-        x = np.copy(self.data[0::2])
-        y = np.copy(self.data[1::2])
-        self.data[0::2] = (cost*(x)-sint*(y)+x0)
-        self.data[1::2] = (sint*(x)+cost*(y)+y0)
+        cost, sint = _rotation(rot)
+        if(HAS_NUMBA):
+            _rotate_points(self.data,0.0,0.0,cost,sint,x0,y0)
+        else:
+            # Points as rows (x,y), rotated by multiplying with the transposed rotation matrix
+            xy = np.dot(self.data.reshape(-1,2),((cost,sint),(-sint,cost)))
+            xy += (x0,y0)
+            self.data[:] = xy.reshape(-1)
+        self._bbox = self._idata = None
         
     def rotate(self,x0,y0,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
-        x = np.copy(self.data[0::2])
-        y = np.copy(self.data[1::2])
-        self.data[0::2] = cost*(x-x0)-sint*(y-y0)+x0
-        self.data[1::2] = sint*(x-x0)+cost*(y-y0)+y0
+        cost, sint = _rotation(rot)
+        if(HAS_NUMBA):
+            _rotate_points(self.data,x0,y0,cost,sint,x0,y0)
+        else:
+            xy = self.data.reshape(-1,2)-(x0,y0)
+            xy = np.dot(xy,((cost,sint),(-sint,cost)))
+            xy += (x0,y0)
+            self.data[:] = xy.reshape(-1)
+        self._bbox = self._idata = None
     
     def scale(self,x0,y0,scale_x,scale_y):
-        x = self.data[0::2]
-        y = self.data[1::2]
-        self.data[0::2] = scale_x*(x-x0)+x0
-        self.data[1::2] = scale_y*(y-y0)+y0
+        xy = self.data.reshape(-1,2)
+        xy -= (x0,y0)
+        xy *= (scale_x,scale_y)
+        xy += (x0,y0)
+        self._bbox = self._idata = None
             
     def mirrorX(self,x0):
-        self.data[0::2] = 2*x0-self.data[0::2]
+        x = self.data[0::2]
+        np.subtract(2*x0,x,out=x)
+        self._bbox = self._idata = None
 
     def mirrorY(self,y0):
-        self.data[1::2] = 2*y0-self.data[1::2]
+        y = self.data[1::2]
+        np.subtract(2*y0,y,out=y)
+        self._bbox = self._idata = None
         
     def bounding_box(self):
-        llx = min(self.data[0::2])
-        urx = max(self.data[0::2])
-        lly = min(self.data[1::2])
-        ury = max(self.data[1::2])
-        return Box(llx,lly,urx-llx,ury-lly)
+        # The extent is cached together with the data array it was computed from,
+        # methods that change the points in place reset the cache
+        cache = self._bbox
+        if(cache is None or cache[0] is not self.data):
+            xy = self.data.reshape(-1,2)
+            mn = xy.min(axis=0)
+            mx = xy.max(axis=0)
+            cache = (self.data,mn[0],mn[1],mx[0]-mn[0],mx[1]-mn[1])
+            self._bbox = cache
+        return Box(cache[1],cache[2],cache[3],cache[4])
     
     def area(self):
         area = 0.0;
@@ -1609,27 +1880,46 @@ class Poly:
         return False
 
     def point_inside(self,x,y):
-        c = False
-        n = self.Npts
-        xpts = self.data[0::2]
-        ypts = self.data[1::2]
-        bpx = xpts[0]
-        bpy = ypts[0]
-        for i in range(n-1):
-            fpx = xpts[i+1]
-            fpy = ypts[i+1]
-            a = (fpy > y) != (bpy > y)
-            #print(a)
-            if(bpy-fpy==0):
-                b=True
-            else:
-                b = x < ((bpx - fpx)*(y-fpy)/(bpy-fpy)+fpx)
-            #print(b)
-            if(  a and b ): c= not c
-            bpx = fpx
-            bpy = fpy
-        return c
-    
+        if(HAS_NUMBA):
+            return _point_in_poly(self.data,float(x),float(y))
+        bpx = self.data[0:-2:2]
+        bpy = self.data[1:-2:2]
+        fpx = self.data[2::2]
+        fpy = self.data[3::2]
+        a = (fpy > y) != (bpy > y)
+        with np.errstate(divide='ignore',invalid='ignore'):
+            b = x < ((bpx - fpx)*(y-fpy)/(bpy-fpy)+fpx)
+        return bool(np.bitwise_xor.reduce(a & b))
+
+    def points_inside(self,xs,ys):
+        """
+        Vectorized version of point_inside for arrays of coordinates.
+
+        Parameters
+        ----------
+        xs : numpy.array
+            x-coordinates of the points to test.
+        ys : numpy.array
+            y-coordinates of the points to test.
+
+        Returns
+        -------
+        numpy.array
+            Boolean array, True where the point is inside the polygon.
+
+        """
+        xs = np.asarray(xs,dtype=np.float64).reshape(-1,1)
+        ys = np.asarray(ys,dtype=np.float64).reshape(-1,1)
+        bpx = self.data[0:-2:2]
+        bpy = self.data[1:-2:2]
+        fpx = self.data[2::2]
+        fpy = self.data[3::2]
+        a = (fpy > ys) != (bpy > ys)
+        # horizontal edges never satisfy a, the division result is discarded
+        with np.errstate(divide='ignore',invalid='ignore'):
+            b = xs < ((bpx - fpx)*(ys-fpy)/(bpy-fpy)+fpx)
+        return np.bitwise_xor.reduce(a & b,axis=1)
+
     def anisotropic_resize(self,angle,deltas):
         """
         Performs an anisotropic offset of the polygon 
@@ -1650,101 +1940,128 @@ class Poly:
         """
         xpts = self.data[0::2]
         ypts = self.data[1::2]
-        normals = []
-        for i in range(len(xpts)-1):
-            x1 = xpts[i]
-            y1 = ypts[i]
-            x2 = xpts[i+1]
-            y2 = ypts[i+1]
-            # calculate normal
-            b = x1-x2
-            a = y2-y1
-            c = x2*y1-x1*y2
-            
-            nf = math.sqrt(a*a+b*b)
-            nx = b/nf
-            ny = a/nf
-            alpha = math.degrees(math.atan2(ny,nx))
-            
-            d = np.interp(alpha,angle,deltas)
-            c+=nf*d;
-            normals.append([a,b,c])
-    
-        xpts = []
-        ypts = []
-        normals.append(normals[0])
-        for i in range(len(normals)-1):
-            n1 = normals[i]
-            n2 = normals[i+1]
-            D = n2[1]*n1[0]-n2[0]*n1[1]
-            x = -n1[2]*n2[1]+n2[2]*n1[1]
-            y = +n1[2]*n2[0]-n2[2]*n1[0]
-            xpts.append(x/D)
-            ypts.append(y/D)
+        x1 = xpts[:-1]
+        y1 = ypts[:-1]
+        x2 = xpts[1:]
+        y2 = ypts[1:]
+        # normal line a*x+b*y+c=0 of each edge
+        b = x1-x2
+        a = y2-y1
+        c = x2*y1-x1*y2
+        nf = np.sqrt(a*a+b*b)
+        alpha = np.degrees(np.arctan2(a/nf,b/nf))
+        c = c+nf*np.interp(alpha,angle,deltas)
+        # intersect each shifted edge with the next one (the last wraps to the first)
+        a2 = np.roll(a,-1)
+        b2 = np.roll(b,-1)
+        c2 = np.roll(c,-1)
+        D = b2*a-a2*b
+        xpts = (-c*b2+c2*b)/D
+        ypts = (c*a2-c2*a)/D
         self.set_points(xpts, ypts)
         
 
-class Path:
+def _path_outline(x, y, w):
+    # Outline of a path with more than two points and per-point widths w.
+    # Returns the polygon x and y coordinates: the right side of the path followed
+    # by the left side in reverse order. Uses the numba kernel when available.
+    if(HAS_NUMBA):
+        return _tapered_path_core(np.asarray(x,dtype=np.float64),
+                                  np.asarray(y,dtype=np.float64),
+                                  np.asarray(w,dtype=np.float64))
+    x = np.asarray(x,dtype=np.float64)
+    Npts = x.shape[0]
+    y = np.asarray(y,dtype=np.float64)
+    hw = np.asarray(w,dtype=np.float64)/2
+    ang = np.arctan2(np.diff(y),np.diff(x))
+    ang1 = ang[:-1]
+    ang2 = ang[1:]
+    xj = x[1:-1]
+    yj = y[1:-1]
+    wj = hw[1:-1]
+    d = (x[2:]-x[:-2])*(yj-y[:-2]) - (y[2:]-y[:-2])*(xj-x[:-2])
+    neg = d<0
+    # Offset points on the right (-pi/2) and left (+pi/2) of each segment
+    c1 = np.cos(ang1)
+    s1 = np.sin(ang1)
+    c2 = np.cos(ang2)
+    s2 = np.sin(ang2)
+    wx = wj/np.cos((ang2-ang1)/2)
+    a0 = math.pi/2-(ang1+ang2)/2
+    mx = wx*np.cos(a0)
+    my = wx*np.sin(a0)
+    # Outer side of the bend gets two points, inner side gets the miter point
+    xr = np.stack((np.where(neg,xj+wj*s1,xj+mx),xj+wj*s2),axis=1)
+    yr = np.stack((np.where(neg,yj-wj*c1,yj-my),yj-wj*c2),axis=1)
+    xl = np.stack((np.where(neg,xj-mx,xj-wj*s1),xj-wj*s2),axis=1)
+    yl = np.stack((np.where(neg,yj+my,yj+wj*c1),yj+wj*c2),axis=1)
+    keep1 = np.stack((np.ones(Npts-2,dtype=bool),neg),axis=1)
+    keep2 = np.stack((np.ones(Npts-2,dtype=bool),~neg),axis=1)
+    # Fill a preallocated outline: right side forward, then left side backward
+    n1 = 2+np.count_nonzero(keep1)
+    xp = np.empty(3*Npts-2)
+    yp = np.empty(3*Npts-2)
+    xp[0] = x[0]+hw[0]*s1[0]
+    yp[0] = y[0]-hw[0]*c1[0]
+    xp[1:n1-1] = xr[keep1]
+    yp[1:n1-1] = yr[keep1]
+    xp[n1-1] = x[-1]+hw[-1]*s2[-1]
+    yp[n1-1] = y[-1]-hw[-1]*c2[-1]
+    xp[n1] = x[-1]-hw[-1]*s2[-1]
+    yp[n1] = y[-1]+hw[-1]*c2[-1]
+    xp[n1+1:-1] = xl[keep2][::-1]
+    yp[n1+1:-1] = yl[keep2][::-1]
+    xp[-1] = x[0]-hw[0]*s1[0]
+    yp[-1] = y[0]+hw[0]*c1[0]
+    return xp, yp
+
+
+class Path(_Shape):
     def __init__(self,xpts,ypts,width,layer):
-        self.xpts = xpts
-        self.ypts = ypts
+        self.xpts = np.array(xpts,dtype=np.float64)
+        self.ypts = np.array(ypts,dtype=np.float64)
         self.width = width
         self.layer = layer
-        self.Npts = len(xpts)
+        self.Npts = len(self.xpts)
     
     def translate(self,dx,dy):
-        for i in range(self.Npts):
-            self.xpts[i]=self.xpts[i]+dx
-            self.ypts[i]=self.ypts[i]+dy
+        self.xpts += dx
+        self.ypts += dy
             
     def rotate_translate(self,x0,y0,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
-        for i in range(self.Npts):
-            x=self.xpts[i]
-            y=self.ypts[i]
-            self.xpts[i]=cost*(x)-sint*(y)+x0
-            self.ypts[i]=sint*(x)+cost*(y)+y0
+        cost, sint = _rotation(rot)
+        x = self.xpts
+        y = self.ypts
+        self.xpts = cost*(x)-sint*(y)+x0
+        self.ypts = sint*(x)+cost*(y)+y0
        
     def rotate(self,x0,y0,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
-        for i in range(self.Npts):
-            x=self.xpts[i]
-            y=self.ypts[i]
-            self.xpts[i]=cost*(x-x0)-sint*(y-y0)+x0
-            self.ypts[i]=sint*(x-x0)+cost*(y-y0)+y0
+        cost, sint = _rotation(rot)
+        x = self.xpts
+        y = self.ypts
+        self.xpts = cost*(x-x0)-sint*(y-y0)+x0
+        self.ypts = sint*(x-x0)+cost*(y-y0)+y0
     
     def scale(self,x0,y0,scale_x,scale_y):
-        for i in range(self.Npts):
-            x=self.xpts[i]
-            y=self.ypts[i]
-            self.xpts[i]=scale_x*(x-x0)+x0
-            self.ypts[i]=scale_y*(y-y0)+y0
-            self.width*=scale_x
+        self.xpts = scale_x*(self.xpts-x0)+x0
+        self.ypts = scale_y*(self.ypts-y0)+y0
+        self.width*=scale_x
             
     def mirrorX(self,x0):
-        for i in range(self.Npts):
-            self.xpts[i]=2*x0-self.xpts[i]
+        self.xpts = 2*x0-self.xpts
 
     def mirrorY(self,y0):
-        for i in range(self.Npts):
-            self.ypts[i]=2*y0-self.ypts[i]
+        self.ypts = 2*y0-self.ypts
             
     def bounding_box(self):
-        llx = min(self.xpts)
-        urx = max(self.xpts)
-        lly = min(self.ypts)
-        ury = max(self.ypts)
+        llx = self.xpts.min()
+        urx = self.xpts.max()
+        lly = self.ypts.min()
+        ury = self.ypts.max()
         return Box(llx,lly,urx-llx,ury-lly)
 
     def path_length(self):
-        x=self.xpts
-        y=self.ypts
-        plen = 0.0
-        for i in range(1,self.Npts):
-            plen+=np.sqrt((x[i]-x[i-1])**2 + (y[i]-y[i-1])**2)
-        return plen
+        return float(np.sum(np.sqrt(np.diff(self.xpts)**2 + np.diff(self.ypts)**2)))
         
     def area(self):
         # Approximately the path length * width
@@ -1752,8 +2069,8 @@ class Path:
     
     def centroid(self):
         # Give the average x,y
-        cx = np.array(self.xpts).mean()
-        cy = np.array(self.ypts).mean()
+        cx = self.xpts.mean()
+        cy = self.ypts.mean()
         return cx,cy
     
     def perimeter(self):
@@ -1767,7 +2084,7 @@ class Path:
         p1 = Poly([0],[0],self.layer)
         if(self.Npts==1):
             p1.set_points([-w/2,w/2,w/2,-w/2],[-w/2,-w/2,w/2,w/2])
-            p1.translate(x,y)
+            p1.translate(x[0],y[0])
             
         if(self.Npts==2):
             ang1 = math.atan2(y[1]-y[0],x[1]-x[0]);
@@ -1779,54 +2096,14 @@ class Path:
                           [y[0]+s1,y[1]+s1,y[1]+s2,y[0]+s2])
 
         if(self.Npts>2):
-            xp1 = []
-            yp1 = []
-            xp2 = []
-            yp2 = []
-            for j in range(1,self.Npts-1):
-                ang1 = math.atan2(y[j]-y[j-1],x[j]-x[j-1])
-                ang2 = math.atan2(y[j+1]-y[j],x[j+1]-x[j])
-                d = (x[j+1]-x[j-1])*(y[j]-y[j-1])\
-                    - (y[j+1]-y[j-1])*(x[j]-x[j-1])
-                if(j==1):
-                    xp1.append(x[j-1]+w/2*math.cos(ang1-math.pi/2));
-                    yp1.append(y[j-1]+w/2*math.sin(ang1-math.pi/2));
-                    xp2.append(x[j-1]+w/2*math.cos(ang1+math.pi/2));
-                    yp2.append(y[j-1]+w/2*math.sin(ang1+math.pi/2));
-                    
-                if(d<0):
-                    xp1.append(x[j]+w/2*math.cos(ang1-math.pi/2));
-                    yp1.append(y[j]+w/2*math.sin(ang1-math.pi/2));
-                    xp1.append(x[j]+w/2*math.cos(ang2-math.pi/2));
-                    yp1.append(y[j]+w/2*math.sin(ang2-math.pi/2));
-                    wx = w/2/math.cos((ang2-ang1)/2);
-                    a0 = math.pi/2-(ang1+ang2)/2;
-                    xp2.append(x[j]-wx*math.cos(a0));
-                    yp2.append(y[j]+wx*math.sin(a0));
-                else:
-                    xp2.append(x[j]+w/2*math.cos(ang1+math.pi/2));
-                    yp2.append(y[j]+w/2*math.sin(ang1+math.pi/2));
-                    xp2.append(x[j]+w/2*math.cos(ang2+math.pi/2));
-                    yp2.append(y[j]+w/2*math.sin(ang2+math.pi/2));
-                    wx = w/2/math.cos((ang2-ang1)/2);
-                    a0 = math.pi/2-(ang1+ang2)/2;
-                    xp1.append(x[j]+wx*math.cos(a0));
-                    yp1.append(y[j]-wx*math.sin(a0));
-                if(j==self.Npts-2):
-                    xp1.append(x[j+1]+w/2*math.cos(ang2-math.pi/2));
-                    yp1.append(y[j+1]+w/2*math.sin(ang2-math.pi/2));
-                    xp2.append(x[j+1]+w/2*math.cos(ang2+math.pi/2));
-                    yp2.append(y[j+1]+w/2*math.sin(ang2+math.pi/2));
-            
-            xp2.reverse()
-            yp2.reverse()
-            p1.set_points(xp1+xp2,yp1+yp2)
+            (xp,yp) = _path_outline(x,y,np.full(self.Npts,w,dtype=np.float64))
+            p1.set_points(xp,yp)
         g = GeomGroup();
         g.add(p1)
         return g
 
 
-class Text:
+class Text(_Shape):
     def __init__(self,x0,y0,text,posu,posv,height,width,angle,layer):
         self.x0=x0
         self.y0=y0
@@ -1843,8 +2120,7 @@ class Text:
         self.y0+=dy
     
     def rotate_translate(self, dx,dy,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         xv = self.x0;
         yv = self.y0;
         self.x0 = cost*xv-sint*yv+dx
@@ -1852,8 +2128,7 @@ class Text:
         self.angle += rot
     
     def rotate(self,xc,yc,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         xv = self.x0-xc;
         yv = self.y0-yc;
         self.x0 = cost*xv-sint*yv+xc
@@ -1887,36 +2162,25 @@ class Text:
     def perimeter(self):
         return 0
     
-    def __to_path(self):
+    def to_polygon(self):
         offset =0;
         g = GeomGroup();
         for c in self.text:
-            #print("processing letter %s" % c)
             if(c==' '):
                 offset+=self.height
             if c in _glyphs:
-                letter = deepcopy(_glyphs[c][0])
-                letter.set_layer(self.layer)
-                letter.scale(0, 0, self.height,self.height)
-                for p in letter.group:
-                    # Note there are only paths in the group
-                    p.width=self.width 
-                letter.translate(offset, 0)
-                g+=letter
+                for data in _glyph_polygons(c,self.height,self.width):
+                    p = Poly([],[],self.layer)
+                    p.set_data(data.copy())
+                    p.translate(offset,0)
+                    g.group.append(p)
                 offset += _glyphs[c][1]*self.height
-        # Now shift depending on posu/posv
-        # offset contains the length of the text
         g.translate(-self.posu*offset/2,(self.posv-2)*self.height/2)
         g.rotate(0,0,self.angle)
         g.translate(self.x0, self.y0)
         return g
-        
-    def to_polygon(self):
-        g = self.__to_path()
-        g.path_to_poly()
-        return g
 
-class RefBase:
+class RefBase(_Shape):
     def __init__(self,x0,y0,mag,angle,mirror):
         self.x0=x0
         self.y0=y0
@@ -1930,8 +2194,7 @@ class RefBase:
         self.y0+=dy
         
     def rotate_translate(self,dx,dy,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         xv = self.x0;
         yv = self.y0;
         self.x0 = cost*xv-sint*yv+dx
@@ -1940,8 +2203,7 @@ class RefBase:
         self.angle = self.angle%360
         
     def rotate(self,xc,yc,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         xv = self.x0-xc;
         yv = self.y0-yc;
         self.x0 = cost*xv-sint*yv+xc
@@ -2032,10 +2294,13 @@ class ARef(SRef):
                 dy = i*self.ay+j*self.by
                 ng = base_group.copy()
                 ng.translate(dx,dy)
-                flat_group+=ng
+                flat_group.group.extend(ng.group)
         return flat_group
 
-class Circle:
+# Cell reference types, for type(geom) in _REF_TYPES checks
+_REF_TYPES = (SRef, ARef)
+
+class Circle(_Shape):
     def __init__(self,x0,y0,r,layer):
         self.x0=x0
         self.y0=y0
@@ -2047,16 +2312,14 @@ class Circle:
         self.y0+=dy
 
     def rotate_translate(self,xc,yc,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         x = self.x0
         y = self.y0
         self.x0 = cost*x-sint*y+xc
         self.y0 = sint*x+cost*y+yc
     
     def rotate(self,xc,yc,rot):
-        cost = math.cos(rot/180*math.pi)
-        sint = math.sin(rot/180*math.pi)
+        cost, sint = _rotation(rot)
         x = self.x0
         y = self.y0
         self.x0 = cost*(x-xc)-sint*(y-yc)+xc